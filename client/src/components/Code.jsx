@@ -1,11 +1,40 @@
 import React, { useState } from 'react';
-import axios from 'axios';
+
+const API_URL = 'https://evolvex.onrender.com';
+
+// Reads the server-sent event stream from /api/code/stream and hands each
+// parsed event to onEvent as it arrives.
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
 
 export const Code = () => {
   const [input, setInput] = useState('');
   const [output, setOutput] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [sessionId, setSessionId] = useState(null);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -14,10 +43,23 @@ export const Code = () => {
     setOutput('');
 
     try {
-      const response = await axios.post('https://evolvex.onrender.com/api/code', {
-        input: input,
+      const response = await fetch(`${API_URL}/api/code/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify(sessionId ? { input: input, session_id: sessionId } : { input: input }),
+      });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      await readEventStream(response, (event, data) => {
+        if (event === 'error') {
+          setError('Failed to process request: ' + data.error);
+        } else if (event === 'message') {
+          setOutput((prev) => prev + data.chunk);
+        } else if (event === 'done' && data.session_id) {
+          setSessionId(data.session_id);
+        }
       });
-      setOutput(response.data.output);
     } catch (err) {
       setError('Failed to process request: ' + err.message);
     } finally {
@@ -0,0 +1,47 @@
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse
+from http_client import aclose_async_client
+from resilience import UpstreamError
+from server import app as flask_app, manager, CORS_ORIGINS, resolve_session_id
+
+# ASGI entrypoint: /api/code runs on the event loop so one worker can keep
+# many upstream completions in flight; every other route is served by the
+# Flask app mounted underneath.
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await aclose_async_client()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS,
+                   allow_methods=["*"], allow_headers=["*"], expose_headers=["X-Session-Id"])
+
+
+@app.post('/api/code')
+async def process_code(request: Request):
+    try:
+        data = await request.json()
+        user_input = data.get('input', '')
+        if not user_input:
+            return JSONResponse({'error': 'No input provided'}, status_code=400)
+        try:
+            session_id = resolve_session_id(data)
+        except ValueError as e:
+            return JSONResponse({'error': str(e), 'status': 'error'}, status_code=400)
+
+        response = await manager.arun(user_input, session_id=session_id)
+        return JSONResponse({'output': response, 'session_id': session_id, 'status': 'success'},
+                            status_code=200)
+
+    except UpstreamError as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=e.http_status)
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'status': 'error'}, status_code=500)
+
+
+app.mount("/", WSGIMiddleware(flask_app))
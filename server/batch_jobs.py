@@ -0,0 +1,101 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from resilience import UpstreamError
+from tracing import tracer
+
+
+class TenantLimiter:
+    # Caps how many batch items one tenant has running at once, across all
+    # of its concurrent requests, so a large CI upload cannot take every
+    # worker. Idle tenants are forgotten.
+    def __init__(self, limit):
+        self.limit = limit
+        self._running = {}
+        self._cond = threading.Condition()
+
+    def try_acquire(self, tenant):
+        with self._cond:
+            if self._running.get(tenant, 0) >= self.limit:
+                return False
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            return True
+
+    def acquire(self, tenant):
+        with self._cond:
+            self._cond.wait_for(lambda: self._running.get(tenant, 0) < self.limit)
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+
+    def release(self, tenant):
+        with self._cond:
+            running = self._running.get(tenant, 0) - 1
+            if running > 0:
+                self._running[tenant] = running
+            else:
+                self._running.pop(tenant, None)
+            self._cond.notify_all()
+
+    def running(self, tenant):
+        with self._cond:
+            return self._running.get(tenant, 0)
+
+
+class BatchRunner:
+    def __init__(self, handler, workers=16, tenant_limit=4):
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self.limiter = TenantLimiter(tenant_limit)
+
+    def _run_item(self, tenant, index, item):
+        start = time.perf_counter()
+        result = {"index": index, "id": item.get("id"), "task": item["task"]}
+        try:
+            result.update(status="success", output=self.handler(item))
+        except UpstreamError as e:
+            result.update(status="error", error=str(e), status_code=e.http_status)
+        except Exception as e:
+            result.update(status="error", error=str(e), status_code=500)
+        finally:
+            self.limiter.release(tenant)
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def run(self, tenant, items):
+        # Yields one result dict per item in completion order. Items are
+        # only handed to the pool while the tenant is under its limit, so
+        # the rest of a batch waits here rather than in the pool's queue
+        # ahead of other tenants.
+        pending = deque(enumerate(items))
+        in_flight = set()
+
+        def start(index, item):
+            in_flight.add(tracer.submit(self.executor, "batch_item", item["task"],
+                                        self._run_item, tenant, index, item))
+
+        try:
+            while pending or in_flight:
+                while pending and self.limiter.try_acquire(tenant):
+                    start(*pending.popleft())
+                if not in_flight:
+                    # Every slot is held by the tenant's other requests.
+                    self.limiter.acquire(tenant)
+                    start(*pending.popleft())
+                    continue
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    in_flight.discard(future)
+                    yield future.result()
+        finally:
+            # The client went away: drop what has not started yet and give
+            # its slots back.
+            for future in in_flight:
+                if future.cancel():
+                    self.limiter.release(tenant)
+
+
+def build_batch_runner(handler):
+    return BatchRunner(handler,
+                       workers=int(os.environ.get("BATCH_WORKERS", 16)),
+                       tenant_limit=int(os.environ.get("BATCH_TENANT_CONCURRENCY", 4)))
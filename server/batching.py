@@ -0,0 +1,83 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class BatchDispatcher:
+    def __init__(self, send_batch, window=0.01, max_batch=16, max_senders=8):
+        # send_batch(params, prompts) -> one result per prompt, in order.
+        self.send_batch = send_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._groups = {}
+        self._cond = threading.Condition()
+        self._senders = ThreadPoolExecutor(max_workers=max_senders, thread_name_prefix="llm-batch")
+        self._thread = threading.Thread(target=self._loop, name="llm-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, params, prompt):
+        # Only prompts with identical sampling parameters can share a request.
+        key = json.dumps(params, sort_keys=True)
+        future = Future()
+        with self._cond:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = {"params": params, "deadline": time.monotonic() + self.window,
+                                             "items": []}
+            group["items"].append((prompt, future, time.monotonic()))
+            if len(group["items"]) >= self.max_batch or len(group["items"]) == 1:
+                self._cond.notify()
+        return future
+
+    def _take_ready(self):
+        now = time.monotonic()
+        ready = []
+        for key, group in list(self._groups.items()):
+            if len(group["items"]) >= self.max_batch or group["deadline"] <= now:
+                items = group["items"]
+                ready.append((group["params"], items[:self.max_batch]))
+                if len(items) > self.max_batch:
+                    group["items"] = items[self.max_batch:]
+                    group["deadline"] = now + self.window
+                else:
+                    del self._groups[key]
+        return ready
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                ready = self._take_ready()
+                while not ready:
+                    if self._groups:
+                        timeout = min(g["deadline"] for g in self._groups.values()) - time.monotonic()
+                        self._cond.wait(max(timeout, 0))
+                    else:
+                        self._cond.wait()
+                    ready = self._take_ready()
+            for params, items in ready:
+                self._senders.submit(self._send, params, items)
+
+    def _send(self, params, items):
+        sent = time.monotonic()
+        for _, future, submitted in items:
+            # Read back by the caller to report how long the prompt waited.
+            future.queue_time = sent - submitted
+        try:
+            results = self.send_batch(params, [prompt for prompt, _, _ in items])
+            for (_, future, _), result in zip(items, results):
+                future.set_result(result)
+        except Exception as e:
+            for _, future, _ in items:
+                if not future.done():
+                    future.set_exception(e)
+
+
+def build_dispatcher(send_batch):
+    window_ms = float(os.environ.get("LLM_BATCH_WINDOW_MS", 0))
+    if window_ms <= 0:
+        return None
+    return BatchDispatcher(send_batch, window=window_ms / 1000,
+                           max_batch=int(os.environ.get("LLM_BATCH_MAX_SIZE", 16)),
+                           max_senders=int(os.environ.get("LLM_BATCH_SENDERS", 8)))
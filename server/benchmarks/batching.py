@@ -0,0 +1,50 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import start_mock_server, mock_stats, percentile
+
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", 64))
+MOCK_LATENCY = float(os.environ.get("BENCH_MOCK_LATENCY", 0.2))
+SETTINGS = [(0, 0), (5, 16), (20, 16), (20, 64)]  # (window ms, max batch); 0 disables batching
+
+
+def main():
+    mock, base = start_mock_server(MOCK_LATENCY=MOCK_LATENCY)
+    os.environ.update(TOGETHER_API_BASE=base, LLM_CACHE="off", TOGETHER_POOL_SIZE="16",
+                      RAG_INDEX_DIR=os.environ.get("RAG_INDEX_DIR", "/tmp/evolvex-bench-index"))
+    try:
+        import server
+        from batching import BatchDispatcher
+        # The mock answers a list of prompts choice for choice, so every
+        # model is marked as accepting one.
+        registry = server.model_selector.registry
+        registry.specs = {name: spec._replace(batch_prompts=True) for name, spec in registry.specs.items()}
+        llm = server.get_llm(temperature=0.1)
+        print(f"{CONCURRENCY} concurrent prompts, mock latency {MOCK_LATENCY * 1000:.0f}ms per request, pool 16")
+        print(f"{'window':>8} {'batch':>6} {'wall':>8} {'p50':>8} {'p99':>8} {'upstream reqs':>14}")
+        for window_ms, max_batch in SETTINGS:
+            server.completion_batcher = (BatchDispatcher(server._send_completion_batch, window=window_ms / 1000,
+                                                         max_batch=max_batch) if window_ms else None)
+            mock_stats(base, reset=True)
+
+            def call(i):
+                start = time.perf_counter()
+                llm(f"prompt number {i}")
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
+                latencies = list(executor.map(call, range(CONCURRENCY)))
+            wall = time.perf_counter() - start
+            requests = mock_stats(base)["completion_requests"]
+            label = f"{window_ms}ms" if window_ms else "off"
+            print(f"{label:>8} {max_batch if window_ms else '-':>6} {wall * 1000:>6.0f}ms "
+                  f"{percentile(latencies, 50) * 1000:>6.0f}ms {percentile(latencies, 99) * 1000:>6.0f}ms {requests:>14}")
+    finally:
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+
+import common  # noqa: F401  (puts the server directory on sys.path)
+
+# Per-request setup cost of building the LLM client, prompt template and
+# tool objects on every call versus fetching the shared instances from the
+# registries. Nothing here touches the network.
+ITERATIONS = int(os.environ.get("BENCH_ITERATIONS", 20000))
+CODE = "def add(a, b):\n    return a + b\n"
+
+
+def per_call(fn, iterations=ITERATIONS):
+    fn()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    os.environ.setdefault("TOGETHER_API_KEY", "bench")
+    os.environ.setdefault("RAG_INDEX_DIR", "/tmp/evolvex-bench-index")
+    import server
+    from langchain_core.prompts import PromptTemplate
+
+    def rebuilt_prompt():
+        llm = server.CustomTogetherLLM(temperature=0.1)
+        prompt = PromptTemplate(template=server.DOCSTRING_TEMPLATE, input_variables=["code"])
+        return llm, prompt.format(code=CODE)
+
+    def shared_prompt():
+        chain = server.chains.get("docstring")
+        return chain.llm, chain.format(code=CODE)
+
+    cases = [
+        ("LLM + PromptTemplate per call", rebuilt_prompt),
+        ("shared PromptChain", shared_prompt),
+        ("new StarCodeCompletion tool", server.StarCodeCompletion),
+        ("shared tool from registry", lambda: server.tool_registry.get("star_code_completion")),
+    ]
+    print(f"{ITERATIONS} iterations each")
+    for label, fn in cases:
+        print(f"{label:<32} {per_call(fn) * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+import sys
+import time
+import socket
+import subprocess
+import urllib.request
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(**env):
+    port = free_port()
+    process_env = dict(os.environ, MOCK_PORT=str(port), **{k: str(v) for k, v in env.items()})
+    process = subprocess.Popen([sys.executable, os.path.join(SERVER_DIR, "mock_together.py")],
+                               env=process_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"{base}/mock/stats", timeout=1)
+            return process, base
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("mock completions server did not start")
+
+
+def mock_stats(base, reset=False):
+    import json
+    request = urllib.request.Request(f"{base}/mock/stats", method="DELETE" if reset else "GET")
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
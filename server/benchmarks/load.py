@@ -0,0 +1,198 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from common import start_mock_server, percentile
+
+# Drives the agent, every tool, RAG queries and the /api/code route against
+# the local mock at fixed concurrency. The route is measured twice: through
+# the Flask app, and through the ASGI app that production serves, whose
+# handler awaits manager.arun on one event loop. Set BENCH_OUTPUT to save the results
+# and BENCH_BASELINE to a saved run to fail on a p95 regression.
+CONCURRENCY = [int(c) for c in os.environ.get("BENCH_CONCURRENCY", "1,8,32").split(",")]
+REQUESTS = int(os.environ.get("BENCH_REQUESTS", 64))
+TARGETS = os.environ.get("BENCH_TARGETS", "agent,tools,rag,route").split(",")
+MOCK_SETTINGS = {"MOCK_LATENCY": os.environ.get("BENCH_MOCK_LATENCY", "0.05"),
+                 "MOCK_TOKEN_RATE": os.environ.get("BENCH_TOKEN_RATE", "0"),
+                 "MOCK_COMPLETION_TOKENS": os.environ.get("BENCH_COMPLETION_TOKENS", "0"),
+                 "MOCK_ERROR_RATE": os.environ.get("BENCH_ERROR_RATE", "0"),
+                 "MOCK_SLOW_RATE": os.environ.get("BENCH_SLOW_RATE", "0")}
+TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", 1.25))
+
+MESSAGES = [
+    "write a python function that merges two sorted lists",
+    "find the bug in this loop: for i in range(len(xs)): xs.remove(xs[i])",
+    "add docstrings to def area(r): return 3.14 * r * r",
+    "what does the knowledge base say about deployment?",
+    "complete this class: class Stack:\n    def push(self, item):",
+    "write a sorting function and find bugs in it and document it",
+]
+TOOL_INPUTS = {
+    "star_code_completion": "def fibonacci(n):",
+    "star_bug_detection": "def div(a, b):\n    return a / b",
+    "star_code_testing": "def add(a, b):\n    return a + b",
+    "docstring_generator": "def add(a, b):\n    return a + b",
+    "readme_generator": "A CLI that converts CSV files to JSON",
+    "bug_detector": "for i in range(10)\n    print(i)",
+    "code_fixer": "Code: for i in range(10)\n    print(i)\nBugs: missing colon",
+    "code_completer": "def is_prime(n):",
+    "rag_query": "How is the service deployed?",
+}
+KNOWLEDGE_BASE = {
+    "deployment.txt": "The service is deployed with gunicorn behind uvicorn workers. "
+                      "Each worker keeps a pooled HTTP session to the completions API.",
+    "agents.txt": "The manager agent routes requests to the code completer, bug detector, "
+                  "documentation agent or the RAG agent.",
+    "indexing.txt": "Documents under the knowledge base are split into chunks, embedded and stored "
+                    "in a persistent Chroma collection.",
+    "caching.txt": "Completions at low temperature are cached in memory or in SQLite, keyed by model, "
+                   "sampling parameters and the prompt hash.",
+    "sessions.txt": "Each session keeps a bounded conversation memory; older turns are folded into "
+                    "a running summary.",
+}
+
+
+def _is_error(result):
+    text = result if isinstance(result, str) else json.dumps(result, default=str)
+    return "Error from Together AI API" in text or text.startswith("Error")
+
+
+def measure(call, concurrency, requests):
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ok = not _is_error(call(i))
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    wall = time.perf_counter() - start
+    latencies = [latency for latency, _ in results]
+    return {"concurrency": concurrency, "requests": requests, "wall": wall,
+            "throughput": requests / wall, "errors": sum(not ok for _, ok in results),
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99)}
+
+
+async def ameasure(call, concurrency, requests):
+    # The async counterpart of measure: every request runs on one event
+    # loop, at most `concurrency` of them in flight.
+    from http_client import aclose_async_client
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = not _is_error(await call(i))
+            except Exception:
+                ok = False
+            return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(timed(i) for i in range(requests)))
+    wall = time.perf_counter() - start
+    await aclose_async_client()
+    latencies = [latency for latency, _ in results]
+    return {"concurrency": concurrency, "requests": requests, "wall": wall,
+            "throughput": requests / wall, "errors": sum(not ok for _, ok in results),
+            "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99)}
+
+
+def build_targets(server):
+    targets = {}
+    if "agent" in TARGETS:
+        targets["agent.run"] = lambda i: server.manager.run(MESSAGES[i % len(MESSAGES)])
+    if "tools" in TARGETS:
+        for name in TOOL_INPUTS:
+            tool = server.tool_registry.get(name)
+            targets[f"tool.{tool.name}"] = lambda i, tool=tool: tool._run(TOOL_INPUTS[tool.name])
+    if "rag" in TARGETS:
+        targets["rag.query"] = lambda i: server.rag_system.query(MESSAGES[3])
+    if "route" in TARGETS:
+        client = server.app.test_client()
+
+        def post(i):
+            response = client.post("/api/code", json={"input": MESSAGES[i % len(MESSAGES)]})
+            return response.get_json() if response.status_code == 200 else "Error"
+        targets["POST /api/code (flask)"] = post
+
+        import httpx
+        from asgi import app as asgi_app
+        asgi_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=asgi_app), base_url="http://bench")
+
+        async def apost(i):
+            response = await asgi_client.post("/api/code", json={"input": MESSAGES[i % len(MESSAGES)]},
+                                              timeout=None)
+            return response.json() if response.status_code == 200 else "Error"
+        targets["POST /api/code (asgi)"] = apost
+    return targets
+
+
+def check_regressions(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["target"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        before = baseline.get((r["target"], r["concurrency"]))
+        if before and r["p95"] > before["p95"] * TOLERANCE:
+            regressions.append(f"{r['target']} @ {r['concurrency']}: p95 "
+                               f"{before['p95'] * 1000:.0f}ms -> {r['p95'] * 1000:.0f}ms")
+    return regressions
+
+
+def main():
+    workdir = tempfile.mkdtemp(prefix="evolvex-bench-")
+    docs_dir = os.path.join(workdir, "knowledge_base")
+    os.makedirs(os.path.join(docs_dir, "text"))
+    for name, text in KNOWLEDGE_BASE.items():
+        with open(os.path.join(docs_dir, "text", name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    mock, base = start_mock_server(**MOCK_SETTINGS)
+    os.environ.update(TOGETHER_API_BASE=base, TOGETHER_API_KEY="bench", LLM_CACHE="off",
+                      EMBEDDINGS_CACHE_PATH="", RAG_COMPRESSION="none",
+                      RAG_INDEX_DIR=os.path.join(workdir, "index"))
+    try:
+        import server
+        server.rag_system.docs_dir = docs_dir
+        server.rag_system.load_documents()
+        targets = build_targets(server)
+
+        settings = ", ".join(f"{k.lower()[5:]}={v}" for k, v in MOCK_SETTINGS.items())
+        print(f"{REQUESTS} requests per run; mock {settings}")
+        print(f"{'target':<28} {'conc':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+        results = []
+        for name, call in targets.items():
+            for concurrency in CONCURRENCY:
+                if asyncio.iscoroutinefunction(call):
+                    r = dict(asyncio.run(ameasure(call, concurrency, REQUESTS)), target=name)
+                else:
+                    r = dict(measure(call, concurrency, REQUESTS), target=name)
+                results.append(r)
+                print(f"{name:<28} {concurrency:>5} {r['throughput']:>8.1f} {r['p50'] * 1000:>6.0f}ms "
+                      f"{r['p95'] * 1000:>6.0f}ms {r['p99'] * 1000:>6.0f}ms {r['errors']:>7}")
+    finally:
+        mock.terminate()
+
+    if os.environ.get("BENCH_OUTPUT"):
+        with open(os.environ["BENCH_OUTPUT"], "w", encoding="utf-8") as f:
+            json.dump({"mock": MOCK_SETTINGS, "results": results}, f, indent=2)
+    if os.environ.get("BENCH_BASELINE"):
+        regressions = check_regressions(results, os.environ["BENCH_BASELINE"])
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
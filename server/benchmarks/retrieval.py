@@ -0,0 +1,123 @@
+import os
+import sys
+import time
+
+import common  # noqa: F401  (puts the server directory on sys.path)
+from common import percentile
+
+# recall@k and per-query latency of dense, BM25 and hybrid (RRF) retrieval
+# on a synthetic API-reference corpus. Half the questions name an exact
+# identifier or error ("what raises QuotaExceededError?"), half paraphrase
+# the description in other words. By default dense vectors are simulated:
+# a paraphrase lands near its document, while an identifier only tells the
+# model the topic, so dense search finds the right area but not the exact
+# function. BENCH_EMBEDDINGS=real embeds the same texts with the configured
+# embeddings backend instead.
+FUNCTIONS = int(os.environ.get("BENCH_DOCS", 2000))
+QUERIES = int(os.environ.get("BENCH_QUERIES", 300))
+K = int(os.environ.get("BENCH_K", 5))
+EMBEDDINGS = os.environ.get("BENCH_EMBEDDINGS", "simulated")
+
+VERBS = ["load", "save", "parse", "validate", "fetch", "render", "resolve", "merge", "encode", "sync"]
+NOUNS = ["user", "profile", "config", "token", "invoice", "session", "report", "quota", "cache", "webhook",
+         "schema", "payment", "backup", "ticket", "upload", "metric"]
+PHRASES = {"load": "reads", "save": "writes", "parse": "parses", "validate": "checks", "fetch": "downloads",
+           "render": "draws", "resolve": "looks up", "merge": "combines", "encode": "serialises", "sync": "mirrors"}
+SYNONYMS = {"load": "retrieves", "save": "stores", "parse": "interprets", "validate": "verifies",
+            "fetch": "pulls", "render": "displays", "resolve": "finds", "merge": "joins", "encode": "packs",
+            "sync": "replicates"}
+
+
+def corpus():
+    import numpy as np
+    rng = np.random.default_rng(11)
+    docs, topics, seen = [], [], set()
+    while len(docs) < FUNCTIONS:
+        verb, a, b = VERBS[rng.integers(len(VERBS))], NOUNS[rng.integers(len(NOUNS))], NOUNS[rng.integers(len(NOUNS))]
+        suffix = int(rng.integers(1000))
+        name = f"{verb}_{a}_{b}_{suffix}"
+        if a == b or name in seen:
+            continue
+        seen.add(name)
+        error = f"{a.title()}{b.title()}{suffix}Error"
+        docs.append({"name": name, "error": error,
+                     "text": f"def {name}(request, *, timeout=30):\n    \"\"\"{PHRASES[verb].capitalize()} the {a} {b} "
+                             f"record {suffix}. Raises {error} when the {b} is missing.\"\"\""})
+        topics.append(VERBS.index(verb) * len(NOUNS) + NOUNS.index(a))
+    queries = []
+    for i in rng.choice(FUNCTIONS, QUERIES, replace=False).tolist():
+        doc = docs[i]
+        verb, a, b, suffix = doc["name"].split("_")
+        if len(queries) % 2:
+            text = f"which function {SYNONYMS[verb]} a {b} belonging to the {a}?"
+        elif len(queries) % 4:
+            text = f"what raises {doc['error']}?"
+        else:
+            text = f"how do I call {doc['name']}"
+        queries.append((text, i))
+    return docs, topics, queries
+
+
+def simulated_embeddings(texts, topics, queries):
+    import numpy as np
+    from langchain_core.embeddings import Embeddings
+    rng = np.random.default_rng(5)
+    centers = rng.normal(size=(max(topics) + 1, 256))
+    vectors = {text: centers[t] + 0.35 * rng.normal(size=256) for text, t in zip(texts, topics)}
+    for n, (q, i) in enumerate(queries):
+        base = vectors[texts[i]] if n % 2 else centers[topics[i]]
+        vectors[q] = base + 0.15 * rng.normal(size=256)
+
+    class SimulatedEmbeddings(Embeddings):
+        def embed_documents(self, batch):
+            return [vectors[t].tolist() for t in batch]
+
+        def embed_query(self, text):
+            return vectors[text].tolist()
+    return SimulatedEmbeddings()
+
+
+def main():
+    from bm25 import BM25Index, HybridRetriever, fetch_documents
+    from vector_store import NumpyVectorStore
+    docs, topics, queries = corpus()
+    texts = [d["text"] for d in docs]
+    if EMBEDDINGS == "real":
+        from embedding_models import get_embeddings
+        embedding = get_embeddings()
+    else:
+        embedding = simulated_embeddings(texts, topics, queries)
+
+    ids = [str(i) for i in range(len(texts))]
+    metadatas = [{"source_path": f"api/{d['name']}.py"} for d in docs]
+    dense = NumpyVectorStore(embedding)
+    dense.add_texts(texts, metadatas, ids)
+    start = time.perf_counter()
+    lexical = BM25Index()
+    lexical.add_texts(texts, ids)
+    lexical.search("warm up")
+    print(f"{len(texts)} documents, {len(queries)} queries, k={K}, {EMBEDDINGS} embeddings; "
+          f"BM25 build {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    retrievers = {
+        "dense": lambda q: dense.similarity_search(q, k=K),
+        "bm25": lambda q: fetch_documents(dense, [doc_id for doc_id, _ in lexical.search(q, k=K)]),
+        "hybrid": HybridRetriever(vectorstore=dense, lexical=lexical, k=K).invoke,
+    }
+    # Exact-match questions are the even ones, paraphrases the odd ones.
+    print(f"{'retriever':<10} {'recall@k':>9} {'exact':>7} {'para':>7} {'p50':>9} {'p95':>9}")
+    for name, retrieve in retrievers.items():
+        hits, latencies = [], []
+        for text, target in queries:
+            start = time.perf_counter()
+            found = retrieve(text)
+            latencies.append(time.perf_counter() - start)
+            hits.append(any(doc.page_content == texts[target] for doc in found))
+        exact, para = hits[0::2], hits[1::2]
+        print(f"{name:<10} {sum(hits) / len(hits):>9.3f} {sum(exact) / len(exact):>7.3f} "
+              f"{sum(para) / len(para):>7.3f} {percentile(latencies, 50) * 1000:>7.2f}ms "
+              f"{percentile(latencies, 95) * 1000:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
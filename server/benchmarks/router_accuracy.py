@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import IntentRouter  # noqa: E402
+
+# Held-out messages (none of them appear in the router's own examples).
+LABELLED_MESSAGES = [
+    ("write a function that parses a csv file and returns a list of dicts", "code_completer"),
+    ("implement quicksort in c++", "code_completer"),
+    ("create a class for a bank account with deposit and withdraw", "code_completer"),
+    ("generate a python script that renames files in a folder", "code_completer"),
+    ("complete the missing parts of this snippet", "code_completer"),
+    ("build a flask endpoint that uploads images", "code_completer"),
+    ("make a javascript function to debounce input", "code_completer"),
+    ("finish this method so it returns the median", "code_completer"),
+    ("write a go program that reads from stdin and counts words", "code_completer"),
+    ("implement an lru cache class and write tests", "code_completer"),
+    ("my code throws an IndexError, can you fix it", "bug_detector"),
+    ("find the bug in this recursive function", "bug_detector"),
+    ("this sql query returns wrong results and I can't see why", "bug_detector"),
+    ("debug this segfault in my c program", "bug_detector"),
+    ("the tests are failing after my refactor", "bug_detector"),
+    ("why does this promise never resolve and return undefined", "bug_detector"),
+    ("check this code for security issues", "bug_detector"),
+    ("fix the off by one error in this loop", "bug_detector"),
+    ("my app crashes on startup with a KeyError", "bug_detector"),
+    ("this function is not working for negative numbers", "bug_detector"),
+    ("write docstrings for every function in this module", "documentation_agent"),
+    ("generate a readme with install and usage sections", "documentation_agent"),
+    ("add comments to this code so juniors understand it", "documentation_agent"),
+    ("document the public api of this class", "documentation_agent"),
+    ("explain what this regex does", "documentation_agent"),
+    ("produce javadoc for these methods", "documentation_agent"),
+    ("create documentation for the endpoints", "documentation_agent"),
+    ("write a google style docstring for this", "documentation_agent"),
+    ("what does the knowledge base say about rate limits", "rag_agent"),
+    ("search the documents for our coding standards", "rag_agent"),
+    ("according to the onboarding guide who approves deploys", "rag_agent"),
+    ("look up the incident response manual", "rag_agent"),
+    ("what is our policy on third party licenses", "rag_agent"),
+    ("which team owns the billing service", "rag_agent"),
+    ("where is the staging environment described in the docs", "rag_agent"),
+    ("find the reference for the internal auth api", "rag_agent"),
+]
+
+
+def main():
+    router = IntentRouter()
+    threshold = float(os.environ.get("ROUTER_MIN_CONFIDENCE", 0.5))
+    correct = 0
+    confident = 0
+    confident_correct = 0
+    confusion = Counter()
+    latencies = []
+    for message, expected in LABELLED_MESSAGES:
+        start = time.perf_counter()
+        decision = router.route(message)
+        latencies.append(time.perf_counter() - start)
+        if decision.agent == expected:
+            correct += 1
+        else:
+            confusion[(expected, decision.agent)] += 1
+        if decision.confidence >= threshold:
+            confident += 1
+            confident_correct += decision.agent == expected
+
+    latencies.sort()
+    n = len(LABELLED_MESSAGES)
+    print(f"messages:            {n}")
+    print(f"top-1 accuracy:      {correct / n:.1%}")
+    print(f"confident (>= {threshold}): {confident / n:.1%} of traffic, "
+          f"{(confident_correct / confident if confident else 0):.1%} accurate")
+    print(f"llm fallback rate:   {(n - confident) / n:.1%}")
+    print(f"latency p50/p99:     {latencies[n // 2] * 1e6:.1f}us / {latencies[int(n * 0.99)] * 1e6:.1f}us")
+    for (expected, got), count in confusion.most_common():
+        print(f"  {expected} -> {got}: {count}")
+
+
+if __name__ == "__main__":
+    main()
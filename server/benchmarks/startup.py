@@ -0,0 +1,49 @@
+import os
+import re
+import sys
+import time
+import subprocess
+import statistics
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = int(os.environ.get("STARTUP_RUNS", 5))
+TOP = int(os.environ.get("STARTUP_TOP_IMPORTS", 15))
+
+# Measures what a freshly scaled-up worker pays before it can answer:
+# interpreter start plus `import server` (module-level setup included).
+
+
+def _time_import(module):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=SERVER_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def _import_profile(module):
+    # Direct imports of the module, with their cumulative cost: -X importtime
+    # indents each nesting level by two spaces.
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=SERVER_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)", line)
+        if match and len(match.group(2)) == 2:
+            rows.append((int(match.group(1)), match.group(3)))
+    return sorted(rows, reverse=True)[:TOP]
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else "server"
+    baseline = [_time_import("sys") for _ in range(RUNS)]
+    timings = [_time_import(module) for _ in range(RUNS)]
+    print(f"interpreter only:   median {statistics.median(baseline) * 1000:.0f}ms")
+    print(f"import {module}:".ljust(20) + f"median {statistics.median(timings) * 1000:.0f}ms, "
+          f"min {min(timings) * 1000:.0f}ms, max {max(timings) * 1000:.0f}ms over {RUNS} runs")
+    print("heaviest top-level imports (cumulative):")
+    for cumulative_us, name in _import_profile(module):
+        print(f"  {cumulative_us / 1000:8.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
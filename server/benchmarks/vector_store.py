@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+
+import common
+from common import percentile
+
+# Build time, query latency and resident memory of the NumPy store (exact
+# and IVF) against Chroma on the same synthetic corpus. Each store runs in
+# its own process so RSS is not shared between them. Embeddings are looked
+# up from precomputed clustered vectors, so only the stores are measured.
+DOCS = int(os.environ.get("BENCH_DOCS", 5000))
+DIM = int(os.environ.get("BENCH_DIM", 768))
+QUERIES = int(os.environ.get("BENCH_QUERIES", 200))
+K = int(os.environ.get("BENCH_K", 5))
+BATCH = int(os.environ.get("BENCH_BATCH", 256))
+STORES = os.environ.get("BENCH_STORES", "numpy,numpy-ivf,chroma").split(",")
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def corpus():
+    import numpy as np
+    rng = np.random.default_rng(7)
+    topics = rng.normal(size=(max(8, DOCS // 100), DIM)).astype(np.float32)
+    docs = topics[rng.integers(len(topics), size=DOCS)] + 0.5 * rng.normal(size=(DOCS, DIM)).astype(np.float32)
+    queries = docs[rng.integers(DOCS, size=QUERIES)] + 0.3 * rng.normal(size=(QUERIES, DIM)).astype(np.float32)
+    return docs, queries
+
+
+def lookup_embeddings(vectors):
+    from langchain_core.embeddings import Embeddings
+
+    class LookupEmbeddings(Embeddings):
+        def embed_documents(self, texts):
+            return [vectors[text].tolist() for text in texts]
+
+        def embed_query(self, text):
+            return vectors[text].tolist()
+    return LookupEmbeddings()
+
+
+def run_store(kind):
+    docs, queries = corpus()
+    texts = [f"doc {i}" for i in range(DOCS)]
+    query_texts = [f"query {i}" for i in range(QUERIES)]
+    vectors = dict(zip(texts, docs))
+    vectors.update(zip(query_texts, queries))
+    embedding = lookup_embeddings(vectors)
+    directory = tempfile.mkdtemp(prefix="evolvex-bench-vs-")
+    if kind == "chroma":
+        from langchain_community.vectorstores import Chroma
+    else:
+        from vector_store import NumpyVectorStore
+    before = rss_mb()
+    try:
+        start = time.perf_counter()
+        if kind == "chroma":
+            store = Chroma(collection_name="bench", embedding_function=embedding, persist_directory=directory)
+        else:
+            store = NumpyVectorStore(embedding, path=directory, ivf_lists=-1 if kind == "numpy-ivf" else 0,
+                                     ivf_min_rows=0)
+        for i in range(0, DOCS, BATCH):
+            store.add_texts(texts[i:i + BATCH], ids=texts[i:i + BATCH])
+        if kind != "chroma":
+            store.similarity_search("query 0", k=K)  # builds the IVF partitions
+            store.save()
+        build = time.perf_counter() - start
+
+        latencies, found = [], []
+        for text in query_texts:
+            start = time.perf_counter()
+            found.append([doc.page_content for doc in store.similarity_search(text, k=K)])
+            latencies.append(time.perf_counter() - start)
+        return {"store": kind, "build_s": build, "p50_ms": percentile(latencies, 50) * 1000,
+                "p95_ms": percentile(latencies, 95) * 1000, "rss_mb": rss_mb() - before, "found": found}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def exact_top_k():
+    import numpy as np
+    docs, queries = corpus()
+    docs = docs / np.linalg.norm(docs, axis=1, keepdims=True)
+    scores = queries @ docs.T
+    return [{f"doc {i}" for i in np.argsort(-row)[:K]} for row in scores]
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--store":
+        print(json.dumps(run_store(sys.argv[2])))
+        return
+    truth = exact_top_k()
+    print(f"{DOCS} docs x {DIM} dims, {QUERIES} queries, k={K}")
+    print(f"{'store':<12} {'build':>8} {'p50':>9} {'p95':>9} {'rss':>9} {'recall@k':>9}")
+    for kind in STORES:
+        result = subprocess.run([sys.executable, os.path.abspath(__file__), "--store", kind], cwd=common.SERVER_DIR,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"{kind:<12} failed: {result.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(result.stdout.strip().splitlines()[-1])
+        recall = sum(len(truth[i] & set(found)) for i, found in enumerate(r["found"])) / (K * QUERIES)
+        print(f"{kind:<12} {r['build_s']:>7.2f}s {r['p50_ms']:>7.2f}ms {r['p95_ms']:>7.2f}ms "
+              f"{r['rss_mb']:>7.1f}MB {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
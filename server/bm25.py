@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import threading
+from collections import Counter
+import numpy as np
+from typing import Any, List
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+_WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+")
+
+
+def tokenize(text):
+    # Identifiers are indexed whole and by their parts, so "parseConfig",
+    # "parse_config" and "parse config" all meet on "parse" and "config"
+    # while an exact identifier still scores higher.
+    tokens = []
+    for word in _WORD_RE.findall(text):
+        lowered = word.lower()
+        tokens.append(lowered)
+        parts = [p.lower() for piece in word.split("_") for p in _CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    # Okapi BM25 over compressed-sparse-row postings: term t's documents are
+    # docs[offsets[t]:offsets[t + 1]] with matching tfs, so scoring a query
+    # is a few vectorised array slices. Only ids and postings are kept; the
+    # chunk texts live in the vector store. Mutations only touch
+    # per-document term counts; the arrays are rebuilt on the next search or
+    # save.
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._ids = []
+        self._rows = {}
+        self._counts = []
+        self._vocab = {}
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tfs = np.zeros(0, dtype=np.float32)
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ids(self):
+        with self._lock:
+            return list(self._ids)
+
+    def _ensure_counts(self):
+        # A loaded index has postings but no per-document counts; they are
+        # read back out of the postings the first time it is modified.
+        if self._counts is None:
+            self._counts = [Counter() for _ in self._ids]
+            for term, t in self._vocab.items():
+                start, end = self._offsets[t], self._offsets[t + 1]
+                for row, tf in zip(self._docs[start:end].tolist(), self._tfs[start:end].tolist()):
+                    self._counts[row][term] = int(tf)
+
+    def add_texts(self, texts, ids):
+        with self._lock:
+            self._ensure_counts()
+            for text, doc_id in zip(texts, ids):
+                counts = Counter(tokenize(text))
+                row = self._rows.get(doc_id)
+                if row is None:
+                    self._rows[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._counts.append(counts)
+                else:
+                    self._counts[row] = counts
+            self._dirty = True
+        return ids
+
+    def add_documents(self, documents, ids):
+        return self.add_texts([d.page_content for d in documents], ids)
+
+    def delete(self, ids):
+        with self._lock:
+            self._ensure_counts()
+            drop = {self._rows[doc_id] for doc_id in ids if doc_id in self._rows}
+            if not drop:
+                return
+            keep = [row for row in range(len(self._ids)) if row not in drop]
+            self._ids = [self._ids[row] for row in keep]
+            self._counts = [self._counts[row] for row in keep]
+            self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+            self._dirty = True
+
+    def _freeze(self):
+        if not self._dirty:
+            return
+        postings = {}
+        for row, counts in enumerate(self._counts):
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((row, tf))
+        terms = sorted(postings)
+        self._vocab = {term: i for i, term in enumerate(terms)}
+        sizes = np.array([len(postings[t]) for t in terms], dtype=np.int64)
+        self._offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        flat = [p for t in terms for p in postings[t]]
+        self._docs = np.array([row for row, _ in flat], dtype=np.int32)
+        self._tfs = np.array([tf for _, tf in flat], dtype=np.float32)
+        self._lengths = np.array([sum(c.values()) for c in self._counts], dtype=np.float32)
+        self._dirty = False
+
+    def search(self, query, k=5):
+        # Returns (chunk id, score) pairs, best first.
+        with self._lock:
+            self._freeze()
+            n = len(self._ids)
+            if n == 0:
+                return []
+            scores = np.zeros(n, dtype=np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self._lengths / max(float(self._lengths.mean()), 1.0))
+            for term in set(tokenize(query)):
+                t = self._vocab.get(term)
+                if t is None:
+                    continue
+                docs = self._docs[self._offsets[t]:self._offsets[t + 1]]
+                tfs = self._tfs[self._offsets[t]:self._offsets[t + 1]]
+                idf = np.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+            hits = np.flatnonzero(scores)
+            if len(hits) > k:
+                hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            hits = hits[np.argsort(-scores[hits])]
+            return [(self._ids[r], float(scores[r])) for r in hits.tolist()]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._freeze()
+            arrays = {"offsets": self._offsets, "docs": self._docs, "tfs": self._tfs, "lengths": self._lengths}
+            for name, array in arrays.items():
+                with open(os.path.join(path, f"{name}.npy.tmp"), "wb") as f:
+                    np.save(f, array)
+            with open(os.path.join(path, "bm25.json.tmp"), "w", encoding="utf-8") as f:
+                json.dump({"k1": self.k1, "b": self.b, "vocab": sorted(self._vocab, key=self._vocab.get),
+                           "ids": self._ids}, f)
+            for name in [f"{n}.npy" for n in arrays] + ["bm25.json"]:
+                os.replace(os.path.join(path, f"{name}.tmp"), os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path):
+        if not os.path.exists(os.path.join(path, "bm25.json")):
+            return None
+        with open(os.path.join(path, "bm25.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if "texts" in data:
+            # Written by a version that duplicated the chunk texts; rebuilt
+            # from the vector store instead.
+            return None
+        index = cls(k1=data["k1"], b=data["b"])
+        index._ids = data["ids"]
+        index._rows = {doc_id: row for row, doc_id in enumerate(index._ids)}
+        index._counts = None
+        index._vocab = {term: i for i, term in enumerate(data["vocab"])}
+        for name in ("offsets", "docs", "tfs", "lengths"):
+            setattr(index, f"_{name}", np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        return index
+
+
+def fetch_documents(vectorstore, ids):
+    # Chunk texts for BM25 hits, in the order given; works for Chroma and
+    # the NumPy store alike.
+    if not ids:
+        return []
+    stored = vectorstore.get(ids=ids)
+    by_id = {doc_id: Document(page_content=text, metadata=metadata or {})
+             for doc_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])}
+    return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+
+class HybridRetriever(BaseRetriever):
+    # Reciprocal rank fusion of dense and BM25 results: each list adds
+    # weight / (rrf_k + rank) for every document it returns, which needs no
+    # calibration between cosine similarities and BM25 scores.
+    vectorstore: Any
+    lexical: Any
+    k: int = 5
+    fetch_k: int = 20
+    rrf_k: int = 60
+    vector_weight: float = 1.0
+    lexical_weight: float = 1.0
+
+    def _fuse(self, ranked_lists):
+        scores, docs = {}, {}
+        for weight, results in ranked_lists:
+            for rank, doc in enumerate(results):
+                key = (doc.page_content, doc.metadata.get("source_path"))
+                docs.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + weight / (self.rrf_k + rank + 1)
+        return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:self.k]]
+
+    def _get_relevant_documents(self, query, *, run_manager=None) -> List[Document]:
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        lexical = fetch_documents(self.vectorstore, [doc_id for doc_id, _ in self.lexical.search(query, k=self.fetch_k)])
+        return self._fuse([(self.vector_weight, dense), (self.lexical_weight, lexical)])
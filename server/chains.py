@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from tracing import tracer
+
+
+class PromptChain:
+    # The part of LLMChain this app uses: fill a template and call the LLM.
+    # Neither the template nor CustomTogetherLLM changes after construction,
+    # so one instance is shared by every request thread.
+    def __init__(self, llm, template, input_variables):
+        self.llm = llm
+        self.template = template
+        self.input_variables = tuple(input_variables)
+
+    def format(self, **inputs):
+        missing = [name for name in self.input_variables if name not in inputs]
+        if missing:
+            raise ValueError(f"Missing prompt inputs: {', '.join(missing)}")
+        return self.template.format(**{name: inputs[name] for name in self.input_variables})
+
+    def run(self, **inputs):
+        return self.llm(self.format(**inputs))
+
+    async def arun(self, **inputs):
+        return await self.llm.acall(self.format(**inputs))
+
+    def stream(self, **inputs):
+        return self.llm.stream(self.format(**inputs))
+
+
+def merge_sections(parts, results):
+    # One section per chunk, labelled with the lines it covers so findings
+    # can be traced back to the original input.
+    sections = []
+    for part, result in zip(parts, results):
+        label = f"lines {part.start_line}-{part.end_line}"
+        if part.name:
+            label = f"{label}, {part.name}"
+        sections.append(f"[{label}]\n{result.strip()}")
+    return "\n\n".join(sections)
+
+
+class ChunkedChain:
+    # Wraps a PromptChain whose input can outgrow the model's context window.
+    # Inputs within input_budget tokens pass straight through; larger ones
+    # are cut by split(text, budget) into pieces that each fit, the pieces
+    # are sent concurrently on executor and the answers are merged.
+    def __init__(self, chain, input_variable, input_budget, split, executor, merge=merge_sections):
+        self.chain = chain
+        self.input_variable = input_variable
+        self.input_budget = input_budget
+        self.split = split
+        self.executor = executor
+        self.merge = merge
+
+    @property
+    def llm(self):
+        return self.chain.llm
+
+    def format(self, **inputs):
+        return self.chain.format(**inputs)
+
+    def _parts(self, inputs):
+        if self.input_variable not in inputs:
+            return []
+        return self.split(inputs[self.input_variable], self.input_budget)
+
+    def _with(self, inputs, part):
+        return dict(inputs, **{self.input_variable: part.text})
+
+    def run(self, **inputs):
+        parts = self._parts(inputs)
+        if len(parts) <= 1:
+            return self.chain.run(**inputs)
+        futures = [tracer.submit(self.executor, "chunk", self.input_variable, self.chain.run, **self._with(inputs, p))
+                   for p in parts]
+        return self.merge(parts, [f.result() for f in futures])
+
+    async def arun(self, **inputs):
+        parts = self._parts(inputs)
+        if len(parts) <= 1:
+            return await self.chain.arun(**inputs)
+        results = await asyncio.gather(*(self.chain.arun(**self._with(inputs, p)) for p in parts))
+        return self.merge(parts, results)
+
+    def stream(self, **inputs):
+        parts = self._parts(inputs)
+        if len(parts) <= 1:
+            yield from self.chain.stream(**inputs)
+            return
+        # Chunks are answered concurrently but emitted in input order, one
+        # whole section at a time.
+        futures = [tracer.submit(self.executor, "chunk", self.input_variable, self.chain.run, **self._with(inputs, p))
+                   for p in parts]
+        for i, (part, future) in enumerate(zip(parts, futures)):
+            yield ("\n\n" if i else "") + self.merge([part], [future.result()])
+
+
+class Registry:
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+        return self
+
+    def get(self, name):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    if name not in self._factories:
+                        raise KeyError(f"Nothing registered under '{name}'")
+                    instance = self._instances[name] = self._factories[name]()
+        return instance
+
+    def warm(self):
+        for name in list(self._factories):
+            self.get(name)
+        return self
+
+    def __contains__(self, name):
+        return name in self._factories
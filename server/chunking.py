@@ -0,0 +1,237 @@
+import os
+import ast
+import re
+from collections import namedtuple
+from tokens import count_tokens
+
+CodeChunk = namedtuple("CodeChunk", ["text", "start_line", "end_line", "name"])
+
+_TOP_LEVEL_RE = re.compile(r"^\S")
+# Declarations in the brace languages: "function f", "class C", "func (r *T) f",
+# "struct S", "const f = (...) =>", a C-family signature "Type name(" or a
+# JavaScript method "name(...) {".
+_DECLARATION_RE = re.compile(
+    r"\b(?:function|class|interface|struct|enum|func|type)\s+(?:\([^)]*\)\s*)?(\w+)"
+    r"|\b(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?(?:\([^)]*\)|\w+)\s*=>"
+    r"|^\s*(?!(?:return|throw|else|new|await|case)\b)(?:[\w:<>\[\],*&]+\s+)+\**(\w+)\s*\("
+    r"|^\s*(?:(?:static|async|get|set)\s+)*(\w+)\s*\([^)]*\)\s*\{")
+_NOT_NAMES = {"if", "for", "while", "switch", "return", "new", "catch", "else", "await"}
+
+LANGUAGE_BY_EXTENSION = {
+    ".py": "Python",
+    ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript", ".ts": "JavaScript", ".tsx": "JavaScript",
+    ".go": "Go",
+    ".java": "Java",
+    ".c": "C++", ".cc": "C++", ".cpp": "C++", ".cxx": "C++", ".h": "C++", ".hh": "C++", ".hpp": "C++",
+}
+
+
+def detect_language(code):
+    if "def " in code or "import " in code or "class " in code and ":" in code:
+        return "Python"
+    elif "function " in code or "const " in code or "let " in code or "var " in code:
+        return "JavaScript"
+    elif "func " in code or "package " in code:
+        return "Go"
+    elif "#include" in code or "int main" in code:
+        return "C++"
+    elif "public class" in code or "import java" in code:
+        return "Java"
+    else:
+        return "Python"
+
+
+def _python_units(source, lines, max_tokens):
+    # (start, end, name) spans of top-level statements, 1-based and
+    # inclusive; comments and blank lines ride with the next definition.
+    # Classes that are too big on their own are opened up into methods.
+    tree = ast.parse(source)
+    units = []
+    for node in tree.body:
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        name = getattr(node, "name", None)
+        span_text = "\n".join(lines[start - 1:node.end_lineno])
+        if isinstance(node, ast.ClassDef) and count_tokens(span_text) > max_tokens and node.body:
+            first = min([node.body[0].lineno] + [d.lineno for d in getattr(node.body[0], "decorator_list", [])])
+            units.append((start, first - 1, name))
+            for child in node.body:
+                child_start = min([child.lineno] + [d.lineno for d in getattr(child, "decorator_list", [])])
+                child_name = getattr(child, "name", None)
+                units.append((child_start, child.end_lineno, f"{name}.{child_name}" if child_name else name))
+        else:
+            units.append((start, node.end_lineno, name))
+    return _close_gaps(units, len(lines))
+
+
+def _indent_units(lines):
+    # Used when the Python does not parse: a new unit starts at every
+    # unindented line that follows an indented block.
+    units, start, indented = [], 1, False
+    for i, line in enumerate(lines, 1):
+        if _TOP_LEVEL_RE.match(line) and indented:
+            units.append((start, i - 1, None))
+            start, indented = i, False
+        elif line.strip() and not _TOP_LEVEL_RE.match(line):
+            indented = True
+    units.append((start, len(lines), None))
+    return units
+
+
+def _declared_name(lines):
+    # Only the unit's head is searched, up to the line that opens its body.
+    for line in lines:
+        match = _DECLARATION_RE.search(line)
+        name = match and next(g for g in match.groups() if g)
+        if name and name not in _NOT_NAMES:
+            return name
+        if "{" in line:
+            break
+    return None
+
+
+def _brace_units(lines):
+    # A unit ends when the brace depth returns to zero on a line that closed
+    # a block or finished a statement.
+    units, start, depth = [], 1, 0
+    for i, line in enumerate(lines, 1):
+        depth = max(0, depth + line.count("{") - line.count("}"))
+        stripped = line.strip()
+        if depth == 0 and (stripped.endswith("}") or stripped.endswith(";") or not stripped) and i >= start:
+            units.append((start, i, _declared_name(lines[start - 1:i])))
+            start = i + 1
+    if start <= len(lines):
+        units.append((start, len(lines), _declared_name(lines[start - 1:])))
+    return units
+
+
+def _brace_members(lines, start, end, name):
+    # Opens a block that is too big on its own one level down, as
+    # _python_units does for classes: the head up to the opening brace, then
+    # each member that ends back at depth one, with the comments and
+    # annotations above it, then the closing brace.
+    depth, body = 0, None
+    for i in range(start, end + 1):
+        depth = max(0, depth + lines[i - 1].count("{") - lines[i - 1].count("}"))
+        if depth:
+            body = i
+            break
+    if body is None or body >= end:
+        return [(start, end, name)]
+    units, member_start = [(start, body, name)], body + 1
+    for i in range(body + 1, end + 1):
+        depth = max(0, depth + lines[i - 1].count("{") - lines[i - 1].count("}"))
+        stripped = lines[i - 1].strip()
+        if depth == 0:
+            break
+        if depth == 1 and (stripped.endswith("}") or stripped.endswith(";")):
+            member = _declared_name(lines[member_start - 1:i])
+            units.append((member_start, i, f"{name}.{member}" if name and member else member or name))
+            member_start = i + 1
+    if member_start <= end:
+        units.append((member_start, end, name))
+    return units
+
+
+def _fit_unit(lines, start, end, name, max_tokens, brace):
+    if count_tokens("\n".join(lines[start - 1:end])) <= max_tokens:
+        return [(start, end, name)]
+    members = _brace_members(lines, start, end, name) if brace else []
+    if len(members) > 1:
+        return [piece for member in members for piece in _fit_unit(lines, *member, max_tokens, brace)]
+    return _split_long(lines, start, end, name, max_tokens)
+
+
+def _close_gaps(units, line_count):
+    spans = []
+    next_start = 1
+    for start, end, name in units:
+        spans.append((next_start, end, name))
+        next_start = end + 1
+    if spans and next_start <= line_count:
+        start, _, name = spans[-1]
+        spans[-1] = (start, line_count, name)
+    return spans or [(1, line_count, None)]
+
+
+def _split_long(lines, start, end, name, max_tokens):
+    # Last resort for a single definition over budget: cut between lines
+    # into pieces of even size rather than full ones plus a stub.
+    sizes = [count_tokens(lines[i - 1]) + 1 for i in range(start, end + 1)]
+    target = sum(sizes) / -(-sum(sizes) // max_tokens)
+    chunks, chunk_start, tokens = [], start, 0
+    for i in range(start, end + 1):
+        line_tokens = sizes[i - start]
+        if tokens and (tokens + line_tokens > max_tokens or tokens >= target):
+            chunks.append((chunk_start, i - 1, name))
+            chunk_start, tokens = i, 0
+        tokens += line_tokens
+    chunks.append((chunk_start, end, name))
+    return chunks
+
+
+def chunk_code(code, max_tokens, language=None):
+    lines = code.split("\n")
+    if count_tokens(code) <= max_tokens:
+        return [CodeChunk(code, 1, len(lines), None)]
+    language = language or detect_language(code)
+    if language == "Python":
+        try:
+            units = _python_units(code, lines, max_tokens)
+        except SyntaxError:
+            units = _indent_units(lines)
+    else:
+        units = _brace_units(lines)
+
+    pieces = []
+    for start, end, name in units:
+        if start <= end:
+            pieces.extend(_fit_unit(lines, start, end, name, max_tokens, language != "Python"))
+
+    # Pack neighbouring units greedily so each request carries as much as the
+    # budget allows.
+    chunks, current, tokens = [], [], 0
+    for start, end, name in pieces:
+        piece_tokens = count_tokens("\n".join(lines[start - 1:end])) + 1
+        if current and tokens + piece_tokens > max_tokens:
+            chunks.append(current)
+            current, tokens = [], 0
+        current.append((start, end, name))
+        tokens += piece_tokens
+    if current:
+        chunks.append(current)
+
+    result = []
+    for group in chunks:
+        start, end = group[0][0], group[-1][1]
+        names = [name for _, _, name in group if name]
+        label = names[0] if len(names) == 1 else (f"{names[0]} .. {names[-1]}" if names else None)
+        result.append(CodeChunk("\n".join(lines[start - 1:end]), start, end, label))
+    return result
+
+
+def language_for_path(path):
+    return LANGUAGE_BY_EXTENSION.get(os.path.splitext(path)[1].lower())
+
+
+class CodeSplitter:
+    # Splits source files for the knowledge base on function/class
+    # boundaries. Chunks do not overlap; instead each starts with a one-line
+    # header naming the file, lines and symbol, which is all a retrieved
+    # chunk needs to be placed back in its file.
+    def __init__(self, max_tokens=400):
+        self.max_tokens = max_tokens
+
+    def split_documents(self, documents, relpath=None):
+        from langchain_core.documents import Document
+        splits = []
+        for document in documents:
+            path = relpath or document.metadata.get("source", "")
+            language = language_for_path(path) or detect_language(document.page_content)
+            for chunk in chunk_code(document.page_content, self.max_tokens, language):
+                if not chunk.text.strip():
+                    continue
+                header = f"# {path}:{chunk.start_line}-{chunk.end_line}" + (f" {chunk.name}" if chunk.name else "")
+                metadata = dict(document.metadata, language=language, start_line=chunk.start_line,
+                                end_line=chunk.end_line, symbol=chunk.name or "")
+                splits.append(Document(page_content=f"{header}\n{chunk.text}", metadata=metadata))
+        return splits
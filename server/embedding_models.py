@@ -0,0 +1,136 @@
+import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from http_client import post_embeddings
+from sqlite_local import ThreadLocalSQLite
+from tracing import tracer
+
+
+class EmbeddingCache:
+    def __init__(self, path):
+        self.path = path
+        self._conn = ThreadLocalSQLite(path)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        conn.commit()
+
+    @staticmethod
+    def key(model, text):
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        found = {}
+        conn = self._conn()
+        # Stay well under SQLite's bound-parameter limit.
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def set_many(self, items):
+        conn = self._conn()
+        conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                         [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items])
+        conn.commit()
+
+
+class TogetherEmbeddings(Embeddings):
+    def __init__(self, model="togethercomputer/m2-bert-80M-8k-retrieval", batch_size=64, max_workers=4):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.api_key = os.environ.get("TOGETHER_API_KEY")
+
+    def _embed_batch(self, texts):
+        with tracer.trace("embedding", self.model, {"batch_size": len(texts)}):
+            response = post_embeddings(
+                {"model": self.model, "input": texts}, api_key=self.api_key)
+            if response.status_code != 200:
+                raise RuntimeError(
+                    f"Error from Together AI API: {response.status_code} - {response.text}")
+            result = response.json()
+            tracer.annotate(prompt_tokens=(result.get("usage") or {}).get("prompt_tokens"))
+            data = sorted(result.get("data", []), key=lambda d: d.get("index", 0))
+            return [d["embedding"] for d in data]
+
+    def embed_documents(self, texts):
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1:
+            return [v for batch in batches for v in self._embed_batch(batch)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return [v for vectors in executor.map(self._embed_batch, batches) for v in vectors]
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0]
+
+
+class LocalEmbeddings(Embeddings):
+    def __init__(self, model="sentence-transformers/all-MiniLM-L6-v2", batch_size=64):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError(
+                "LocalEmbeddings requires sentence-transformers: pip install sentence-transformers")
+        self.model = model
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model)
+
+    def embed_documents(self, texts):
+        with tracer.trace("embedding", self.model, {"batch_size": len(texts)}):
+            return self._model.encode(list(texts), batch_size=self.batch_size,
+                                      normalize_embeddings=True).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, base, cache):
+        self.base = base
+        self.cache = cache
+        self.model = base.model
+
+    def embed_documents(self, texts):
+        keys = [self.cache.key(self.model, text) for text in texts]
+        with tracer.trace("embedding_cache", self.model) as span:
+            vectors = self.cache.get_many(list(set(keys)))
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in vectors:
+                    missing.setdefault(key, text)
+            misses = sum(key in missing for key in keys)
+            span.set(cache_hits=len(keys) - misses, cache_misses=misses)
+            if missing:
+                fresh = self.base.embed_documents(list(missing.values()))
+                computed = list(zip(missing.keys(), fresh))
+                self.cache.set_many(computed)
+                vectors.update(computed)
+            return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        # Only document embeddings are cached: queries and user messages
+        # rarely repeat, and storing them would grow the file without bound
+        # and keep raw user text on disk.
+        return self.base.embed_query(text)
+
+
+def get_embeddings():
+    backend = os.environ.get("EMBEDDINGS_BACKEND", "together").lower()
+    if backend == "local":
+        base = LocalEmbeddings(model=os.environ.get(
+            "EMBEDDINGS_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    else:
+        base = TogetherEmbeddings(
+            model=os.environ.get("EMBEDDINGS_MODEL", "togethercomputer/m2-bert-80M-8k-retrieval"),
+            batch_size=int(os.environ.get("EMBEDDINGS_BATCH_SIZE", 64)),
+            max_workers=int(os.environ.get("EMBEDDINGS_CONCURRENCY", 4)))
+    cache_path = os.environ.get("EMBEDDINGS_CACHE_PATH", "./.cache/embeddings.sqlite3")
+    if cache_path.lower() in ("off", "none", ""):
+        return base
+    return CachedEmbeddings(base, EmbeddingCache(cache_path))
@@ -0,0 +1,97 @@
+import os
+import json
+import asyncio
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE = os.environ.get("TOGETHER_API_BASE", "https://api.together.xyz").rstrip("/")
+COMPLETIONS_ENDPOINT = f"{API_BASE}/v1/completions"
+EMBEDDINGS_ENDPOINT = f"{API_BASE}/v1/embeddings"
+
+POOL_SIZE = int(os.environ.get("TOGETHER_POOL_SIZE", 32))
+CONNECT_TIMEOUT = float(os.environ.get("TOGETHER_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("TOGETHER_READ_TIMEOUT", 120))
+ASYNC_POOL_SIZE = int(os.environ.get("TOGETHER_ASYNC_POOL_SIZE", 256))
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_session():
+    session = requests.Session()
+    # One pool per host; pool_maxsize bounds the keep-alive sockets kept open
+    # and block=True makes callers wait for a free socket instead of opening more.
+    adapter = HTTPAdapter(pool_connections=4,
+                          pool_maxsize=POOL_SIZE, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+def get_session():
+    global _session, _session_pid
+    # Sessions are created lazily per process so gunicorn workers never share
+    # sockets inherited across fork().
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                _session = _build_session()
+                _session_pid = os.getpid()
+    return _session
+
+
+def close_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def auth_headers(api_key=None):
+    return {"Authorization": f"Bearer {api_key or os.environ.get('TOGETHER_API_KEY')}"}
+
+
+def post_completion(data, api_key=None, timeout=None, stream=False):
+    return get_session().post(
+        COMPLETIONS_ENDPOINT, headers=auth_headers(api_key), data=json.dumps(data),
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+
+
+def post_embeddings(data, api_key=None, timeout=None):
+    return get_session().post(
+        EMBEDDINGS_ENDPOINT, headers=auth_headers(api_key), data=json.dumps(data),
+        timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT))
+
+
+def get_async_client():
+    # httpx.AsyncClient is bound to the loop it was first used on, so keep one
+    # per running loop rather than one per process.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=ASYNC_POOL_SIZE,
+                                max_keepalive_connections=ASYNC_POOL_SIZE),
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            headers={"Content-Type": "application/json"})
+        _async_clients[loop] = client
+    return client
+
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def apost_completion(data, api_key=None, timeout=None):
+    return await get_async_client().post(
+        COMPLETIONS_ENDPOINT, headers=auth_headers(api_key), content=json.dumps(data),
+        timeout=timeout or httpx.USE_CLIENT_DEFAULT)
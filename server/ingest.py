@@ -0,0 +1,75 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+def load_file(docs_dir, relpath, kind):
+    # Runs inside a worker process, so the loaders are imported here rather
+    # than pickled across.
+    from langchain_community.document_loaders import TextLoader, CSVLoader, PyPDFLoader
+    loader_cls = {"text": TextLoader, "csv": CSVLoader, "pdf": PyPDFLoader, "code": TextLoader}[kind]
+    return loader_cls(os.path.join(docs_dir, relpath)).load()
+
+
+class IngestPipeline:
+    def __init__(self, vectorstore, split, workers=None, max_in_flight=None, batch_size=256, lexical_index=None):
+        self.vectorstore = vectorstore
+        self.lexical_index = lexical_index
+        self.split = split
+        self.workers = workers or int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+        self.max_in_flight = max_in_flight or int(os.environ.get("INGEST_MAX_IN_FLIGHT", self.workers * 2))
+        self.batch_size = int(os.environ.get("INGEST_BATCH_SIZE", batch_size))
+        self.failed = []
+
+    def _flush(self, buffer, ids):
+        for i in range(0, len(buffer), self.batch_size):
+            self.vectorstore.add_documents(buffer[i:i + self.batch_size], ids=ids[i:i + self.batch_size])
+        if self.lexical_index is not None:
+            self.lexical_index.add_documents(buffer, ids=ids)
+        buffer.clear()
+        ids.clear()
+
+    def run(self, docs_dir, changed):
+        # Yields lists of (relpath, kind, stat, sha256, chunk_ids) for files
+        # whose chunks are fully upserted, so the caller can checkpoint its
+        # manifest as the pipeline goes.
+        pending = iter(changed)
+        buffer, buffer_ids, committed = [], [], []
+        # Workers are spawned, not forked: by now this process runs the
+        # batcher, hedge, fan-out and warm-up threads, and a forked child can
+        # inherit one of their locks held forever.
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            in_flight = {}
+
+            def submit_next():
+                item = next(pending, None)
+                if item is not None:
+                    relpath, kind = item[0], item[1]
+                    in_flight[executor.submit(load_file, docs_dir, relpath, kind)] = item
+                return item is not None
+
+            # Only max_in_flight files are parsed ahead of the embedder; a new
+            # file is submitted each time one is consumed.
+            while len(in_flight) < self.max_in_flight and submit_next():
+                pass
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    relpath, kind, stat, sha256 = in_flight.pop(future)
+                    submit_next()
+                    try:
+                        splits, ids = self.split(relpath, kind, future.result(), sha256)
+                    except Exception as e:
+                        self.failed.append((relpath, str(e)))
+                        continue
+                    buffer.extend(splits)
+                    buffer_ids.extend(ids)
+                    committed.append((relpath, kind, stat, sha256, ids))
+                    if len(buffer) >= self.batch_size:
+                        self._flush(buffer, buffer_ids)
+                        yield committed
+                        committed = []
+        if buffer:
+            self._flush(buffer, buffer_ids)
+        if committed:
+            yield committed
@@ -0,0 +1,154 @@
+import os
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from sqlite_local import ThreadLocalSQLite
+
+
+class LRUCache:
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self._conn = ThreadLocalSQLite(path)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        conn.commit()
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, json.dumps(value), time.time() + self.ttl))
+        conn.commit()
+
+    def delete(self, key):
+        conn = self._conn()
+        conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM completions")
+        conn.commit()
+
+
+class TieredCache:
+    def __init__(self, *tiers):
+        self.tiers = tiers
+
+    def get(self, key):
+        for i, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                for faster in self.tiers[:i]:
+                    faster.set(key, value)
+                return value
+        return None
+
+    def set(self, key, value):
+        for tier in self.tiers:
+            tier.set(key, value)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+
+class CompletionCache:
+    def __init__(self, backend, max_temperature=0.5):
+        self.backend = backend
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(model, prompt, temperature, max_tokens):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{model}:{temperature}:{max_tokens}:{prompt_hash}"
+
+    def cacheable(self, temperature):
+        # Sampling at high temperature is asked for precisely to get varied
+        # answers, so those calls always go upstream.
+        return temperature <= self.max_temperature
+
+    def get(self, model, prompt, temperature, max_tokens):
+        if not self.cacheable(temperature):
+            return None
+        value = self.backend.get(self.key(model, prompt, temperature, max_tokens))
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, model, prompt, temperature, max_tokens, text):
+        if self.cacheable(temperature):
+            self.backend.set(self.key(model, prompt, temperature, max_tokens), text)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+def build_completion_cache():
+    mode = os.environ.get("LLM_CACHE", "memory").lower()
+    if mode in ("off", "none", "0", "false"):
+        return None
+    ttl = float(os.environ.get("LLM_CACHE_TTL", 3600))
+    tiers = [LRUCache(max_entries=int(os.environ.get("LLM_CACHE_SIZE", 1024)), ttl=ttl)]
+    if mode == "sqlite":
+        tiers.append(SQLiteCache(os.environ.get("LLM_CACHE_PATH", "./.cache/completions.sqlite3"),
+                                 ttl=float(os.environ.get("LLM_CACHE_DISK_TTL", 86400))))
+    backend = tiers[0] if len(tiers) == 1 else TieredCache(*tiers)
+    return CompletionCache(backend, max_temperature=float(os.environ.get("LLM_CACHE_MAX_TEMPERATURE", 0.5)))
+
+
+completion_cache = build_completion_cache()
@@ -0,0 +1,127 @@
+import re
+import json
+import time
+import threading
+from collections import deque
+from tokens import count_tokens
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def _first_sentence(text, max_tokens):
+    sentence = _SENTENCE_END_RE.split(text.strip(), maxsplit=1)[0]
+    if count_tokens(sentence) <= max_tokens:
+        return sentence
+    # Room is left for the "..." marking the cut.
+    limit = max(1, max_tokens - count_tokens("..."))
+    while sentence and count_tokens(sentence) > limit:
+        sentence = sentence[:len(sentence) * limit // count_tokens(sentence) - 1]
+    return sentence.rstrip() + "..."
+
+
+class ConversationMemory:
+    def __init__(self, token_budget=1024, summary_budget=256, summarizer=None, max_artifact_bytes=65536):
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.summarizer = summarizer
+        self.max_artifact_bytes = max_artifact_bytes
+        self.turns = deque()
+        self.summary = ""
+        self.tokens = 0
+        self.artifacts = {}
+        self.last_used = time.time()
+        self._evicted = []
+        self._lock = threading.Lock()
+        self._fold_lock = threading.Lock()
+
+    def append(self, turn):
+        with self._lock:
+            self.turns.append(turn)
+            self.tokens += count_tokens(turn)
+            self.last_used = time.time()
+            # Keep the newest turn even if it alone exceeds the budget.
+            while self.tokens > self.token_budget and len(self.turns) > 1:
+                evicted = self.turns.popleft()
+                self.tokens -= count_tokens(evicted)
+                self._evicted.append(evicted)
+            pending = bool(self._evicted)
+        if pending:
+            self._fold_evicted()
+
+    def _fold_evicted(self):
+        # The summarizer may be an LLM call, so it runs outside the memory
+        # lock; folds are serialised on their own lock so each one starts
+        # from the summary the previous one wrote.
+        with self._fold_lock:
+            with self._lock:
+                evicted, self._evicted = self._evicted, []
+                summary = self.summary
+            if not evicted:
+                return
+            if self.summarizer is not None:
+                summary = self.summarizer(summary, evicted)
+            else:
+                # Extractive: the opening sentence of each evicted turn, oldest
+                # lines dropped once the summary outgrows its budget.
+                lines = [line for line in summary.split("\n") if line]
+                lines += [_first_sentence(turn, self.summary_budget // 4) for turn in evicted]
+                while len(lines) > 1 and count_tokens("\n".join(lines)) > self.summary_budget:
+                    lines.pop(0)
+                summary = "\n".join(lines)
+            with self._lock:
+                self.summary = summary
+
+    def to_prompt(self):
+        with self._lock:
+            parts = []
+            if self.summary:
+                parts.append(f"Summary of earlier conversation:\n{self.summary}")
+            if self.turns:
+                parts.append("Recent conversation:\n" + "\n".join(self.turns))
+            return "\n".join(parts)
+
+    def set_artifact(self, key, value):
+        with self._lock:
+            self.artifacts.pop(key, None)
+            self.artifacts[key] = value
+            # Oldest artifacts go first once the session is over its cap.
+            while len(self.artifacts) > 1 and len(json.dumps(self.artifacts)) > self.max_artifact_bytes:
+                self.artifacts.pop(next(iter(self.artifacts)))
+
+    def get_artifact(self, key, default=None):
+        return self.artifacts.get(key, default)
+
+    def to_dict(self):
+        with self._lock:
+            return {"turns": list(self.turns), "summary": self.summary,
+                    "artifacts": self.artifacts, "last_used": self.last_used}
+
+    @classmethod
+    def from_dict(cls, data, **kwargs):
+        memory = cls(**kwargs)
+        memory.turns = deque(data.get("turns", []))
+        memory.tokens = sum(count_tokens(turn) for turn in memory.turns)
+        memory.summary = data.get("summary", "")
+        memory.artifacts = data.get("artifacts", {})
+        memory.last_used = data.get("last_used", time.time())
+        return memory
+
+    def __iter__(self):
+        return iter(list(self.turns))
+
+    def __len__(self):
+        return len(self.turns)
+
+
+def llm_summarizer(llm):
+    def summarize(summary, evicted):
+        prompt = f"""
+        Update the running summary of a conversation with the turns below. Keep names, code identifiers, decisions and open questions; drop pleasantries. Answer with the summary only, in a few short lines.
+        Current summary:
+        {summary or "(empty)"}
+        New turns:
+        {chr(10).join(evicted)}
+        Updated summary:
+        """
+        return llm(prompt).strip()
+    return summarize
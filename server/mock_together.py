@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from flask import Flask, Response, request, jsonify
+
+# Local stand-in for the Together completions API. Point the server at it with
+#   TOGETHER_API_BASE=http://127.0.0.1:8001 python server.py
+# while running
+#   python mock_together.py
+
+app = Flask(__name__)
+
+MOCK_LATENCY = float(os.environ.get("MOCK_LATENCY", 0.05))
+MOCK_EMBEDDING_DIM = int(os.environ.get("MOCK_EMBEDDING_DIM", 384))
+# Generation speed in tokens per second (0 = instant) and completion length
+# in words (0 = just echo the prompt head).
+MOCK_TOKEN_RATE = float(os.environ.get("MOCK_TOKEN_RATE", 0))
+MOCK_COMPLETION_TOKENS = int(os.environ.get("MOCK_COMPLETION_TOKENS", 0))
+# Fraction of completion requests answered with MOCK_ERROR_STATUS.
+MOCK_ERROR_RATE = float(os.environ.get("MOCK_ERROR_RATE", 0))
+MOCK_ERROR_STATUS = int(os.environ.get("MOCK_ERROR_STATUS", 503))
+# Models that always fail, to exercise fallback to another model.
+MOCK_FAIL_MODELS = {m for m in os.environ.get("MOCK_FAIL_MODELS", "").split(",") if m}
+# Fraction of requests that stall for MOCK_SLOW_LATENCY instead, to give the
+# latency distribution a tail.
+MOCK_SLOW_RATE = float(os.environ.get("MOCK_SLOW_RATE", 0))
+MOCK_SLOW_LATENCY = float(os.environ.get("MOCK_SLOW_LATENCY", 2.0))
+
+stats = {"completion_requests": 0, "completion_prompts": 0, "completion_errors": 0, "embedding_requests": 0}
+_stats_lock = threading.Lock()
+_random = random.Random(int(os.environ.get("MOCK_SEED", 0)))
+
+
+def _completion_text(prompt):
+    text = f"mock completion for: {prompt.strip()[:80]}"
+    padding = MOCK_COMPLETION_TOKENS - len(text.split())
+    return text + " token" * padding if padding > 0 else text
+
+
+def _generation_time(text):
+    return len(text.split()) / MOCK_TOKEN_RATE if MOCK_TOKEN_RATE > 0 else 0.0
+
+
+def _stream_chunks(text):
+    delay = 1 / MOCK_TOKEN_RATE if MOCK_TOKEN_RATE > 0 else 0.0
+    for token in text.split(" "):
+        if delay:
+            time.sleep(delay)
+        chunk = {"choices": [{"index": 0, "text": token + " "}]}
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.route('/v1/completions', methods=['POST'])
+def completions():
+    data = request.get_json(force=True)
+    prompt = data.get("prompt", "")
+    prompts = prompt if isinstance(prompt, list) else [prompt]
+    with _stats_lock:
+        stats["completion_requests"] += 1
+        stats["completion_prompts"] += len(prompts)
+        failed = _random.random() < MOCK_ERROR_RATE or data.get("model") in MOCK_FAIL_MODELS
+        slow = _random.random() < MOCK_SLOW_RATE
+        if failed:
+            stats["completion_errors"] += 1
+    time.sleep(MOCK_SLOW_LATENCY if slow else MOCK_LATENCY)
+    if failed:
+        return jsonify({"error": {"message": "mock upstream failure"}}), MOCK_ERROR_STATUS
+    texts = [_completion_text(p) for p in prompts]
+    if data.get("stream"):
+        return Response(_stream_chunks(texts[0]), mimetype='text/event-stream')
+    # A multi-prompt request generates its completions in parallel.
+    time.sleep(max(_generation_time(text) for text in texts))
+    return jsonify({
+        "id": "mock-completion",
+        "object": "text_completion",
+        "model": data.get("model", ""),
+        "choices": [{"index": i, "text": text, "finish_reason": "stop"} for i, text in enumerate(texts)],
+        "usage": {"prompt_tokens": sum(len(p.split()) for p in prompts),
+                  "completion_tokens": sum(len(t.split()) for t in texts)},
+    }), 200
+
+
+@app.route('/mock/stats', methods=['GET', 'DELETE'])
+def mock_stats():
+    with _stats_lock:
+        snapshot = dict(stats)
+        if request.method == 'DELETE':
+            for key in stats:
+                stats[key] = 0
+    return jsonify(snapshot), 200
+
+
+def _embedding(text):
+    # Deterministic bag-of-words hashing so identical and overlapping texts
+    # land close together, which is enough to exercise retrieval end to end.
+    vector = [0.0] * MOCK_EMBEDDING_DIM
+    for word in text.lower().split():
+        digest = hashlib.md5(word.encode("utf-8")).digest()
+        vector[int.from_bytes(digest[:4], "little") % MOCK_EMBEDDING_DIM] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+@app.route('/v1/embeddings', methods=['POST'])
+def embeddings():
+    data = request.get_json(force=True)
+    inputs = data.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    with _stats_lock:
+        stats["embedding_requests"] += 1
+    time.sleep(MOCK_LATENCY)
+    return jsonify({
+        "object": "list",
+        "model": data.get("model", ""),
+        "data": [{"object": "embedding", "index": i, "embedding": _embedding(text)}
+                 for i, text in enumerate(inputs)],
+    }), 200
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("MOCK_PORT", 8001))
+    app.run(host='127.0.0.1', port=port, threaded=True)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+from resilience import UpstreamError
+from tokens import PromptTooLarge
+from tracing import tracer
+
+ModelSpec = namedtuple("ModelSpec", ["name", "capabilities", "tier", "cost_per_mtok", "latency_hint",
+                                     "context_window", "batch_prompts"], defaults=(False,))
+
+# Quality tiers: 1 fast and cheap, 2 standard, 3 strongest. latency_hint is
+# the assumed seconds per call until real measurements exist; costs are USD
+# per million tokens; context_window counts prompt and completion together.
+# batch_prompts marks models whose endpoint answers a list-valued prompt
+# with one choice per prompt; none is assumed to until the registry says so.
+DEFAULT_MODELS = [
+    ModelSpec("meta-llama/Llama-3-8b-chat-hf", ("chat",), 1, 0.20, 0.8, 8192),
+    ModelSpec("mistralai/Mixtral-8x7B-Instruct-v0.1", ("chat",), 2, 0.60, 1.5, 32768),
+    ModelSpec("togethercomputer/CodeLlama-34b-Instruct", ("code", "chat"), 2, 0.78, 2.0, 16384),
+    ModelSpec("meta-llama/Llama-3-70b-chat-hf", ("chat", "code"), 3, 0.90, 2.5, 8192),
+    ModelSpec("togethercomputer/StarCoder", ("code_completion",), 2, 0.30, 1.0, 8192),
+]
+DEFAULT_CONTEXT_WINDOW = int(os.environ.get("DEFAULT_CONTEXT_WINDOW", 8192))
+
+
+class ModelStats:
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.failures = 0
+        self.tokens = 0
+        self.cost = 0.0
+        self.last_failure = 0.0
+
+    def record(self, latency, ok):
+        self.calls += 1
+        if ok:
+            self.latency = latency if self.latency is None else (
+                self.alpha * latency + (1 - self.alpha) * self.latency)
+        else:
+            self.failures += 1
+            self.last_failure = time.time()
+        self.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * self.error_rate
+
+
+class ModelRegistry:
+    def __init__(self, specs=DEFAULT_MODELS):
+        self.specs = {spec.name: spec for spec in specs}
+        self.stats = {spec.name: ModelStats() for spec in specs}
+        self._lock = threading.Lock()
+
+    def record_call(self, model, latency, ok):
+        with self._lock:
+            if model in self.stats:
+                self.stats[model].record(latency, ok)
+
+    def record_usage(self, model, usage):
+        if not usage or model not in self.specs:
+            return
+        tokens = (usage.get("prompt_tokens") or 0) + (usage.get("completion_tokens") or 0)
+        with self._lock:
+            self.stats[model].tokens += tokens
+            self.stats[model].cost += tokens * self.specs[model].cost_per_mtok / 1e6
+
+    def snapshot(self, breaker_states=None):
+        breaker_states = breaker_states or {}
+        with self._lock:
+            return {name: {"tier": spec.tier, "capabilities": list(spec.capabilities),
+                           "context_window": spec.context_window, "batch_prompts": spec.batch_prompts,
+                           "breaker": breaker_states.get(name, "closed"),
+                           "latency_ms": None if s.latency is None else round(s.latency * 1000, 1),
+                           "error_rate": round(s.error_rate, 3), "calls": s.calls, "failures": s.failures,
+                           "tokens": s.tokens, "cost_usd": round(s.cost, 6)}
+                    for name, spec in self.specs.items() for s in [self.stats[name]]}
+
+
+def parse_route(route, registry):
+    # "code,chat@2" asks for a code model (chat as a fallback) of tier 2 or
+    # better; a bare model name pins that model first and falls back to
+    # models sharing its capabilities at the same tier or better.
+    if route in registry.specs:
+        spec = registry.specs[route]
+        return spec.capabilities, spec.tier, route
+    if "/" in route:
+        return (), 1, route
+    capabilities, _, tier = route.partition("@")
+    return tuple(c.strip() for c in capabilities.split(",") if c.strip()), int(tier or 1), None
+
+
+class ModelSelector:
+    def __init__(self, registry, policy, cost_weight=0.0, error_threshold=0.5, recovery_time=60.0):
+        self.registry = registry
+        self.policy = policy
+        self.cost_weight = cost_weight
+        self.error_threshold = error_threshold
+        self.recovery_time = recovery_time
+
+    def healthy(self, model):
+        if self.policy.breaker(model).state == "open":
+            return False
+        stats = self.registry.stats.get(model)
+        if stats is None:
+            return True
+        # A high error rate stops counting against a model once it has had
+        # time to recover; the breaker's half-open probe covers the rest.
+        return stats.error_rate < self.error_threshold or time.time() - stats.last_failure > self.recovery_time
+
+    def _score(self, spec):
+        stats = self.registry.stats[spec.name]
+        latency = spec.latency_hint if stats.latency is None else stats.latency
+        return latency + self.cost_weight * spec.cost_per_mtok, spec.cost_per_mtok
+
+    def candidates(self, route):
+        capabilities, min_tier, pinned = parse_route(route, self.registry)
+        if not capabilities and pinned is None:
+            raise ValueError(f"Unknown model route '{route}'")
+        ordered = []
+        for capability in capabilities:
+            group = [spec for spec in self.registry.specs.values()
+                     if capability in spec.capabilities and spec.tier >= min_tier
+                     and spec.name not in ordered and spec.name != pinned]
+            ordered += [spec.name for spec in sorted(group, key=self._score)]
+        if pinned is not None:
+            ordered.insert(0, pinned)
+        # Unhealthy models stay on the list as a last resort.
+        return [m for m in ordered if self.healthy(m)] + [m for m in ordered if not self.healthy(m)]
+
+    def context_window(self, model):
+        spec = self.registry.specs.get(model)
+        return spec.context_window if spec else DEFAULT_CONTEXT_WINDOW
+
+    def route_window(self, route):
+        # The window every candidate can honour, so input sized to it never
+        # depends on which model ends up answering.
+        return min(self.context_window(m) for m in self.candidates(route))
+
+    def batchable(self, route):
+        # A multi-prompt request may land on any candidate, so all of them
+        # must accept one.
+        return all(m in self.registry.specs and self.registry.specs[m].batch_prompts
+                   for m in self.candidates(route))
+
+    def run(self, route, attempt):
+        # attempt(model) makes the call through the resilience policy and
+        # raises UpstreamError when that model cannot answer.
+        last_error = None
+        for i, model in enumerate(self.candidates(route)):
+            start = time.perf_counter()
+            try:
+                result = attempt(model)
+            except PromptTooLarge as e:
+                # Not the model's fault; move on to one with a larger window.
+                last_error = _larger_window(last_error, e)
+                continue
+            except UpstreamError as e:
+                self.registry.record_call(model, time.perf_counter() - start, False)
+                last_error = e
+                continue
+            self.registry.record_call(model, time.perf_counter() - start, True)
+            tracer.annotate(model=model, fallbacks=i)
+            return result
+        raise last_error or UpstreamError(f"No model available for route '{route}'")
+
+    async def arun(self, route, attempt):
+        last_error = None
+        for i, model in enumerate(self.candidates(route)):
+            start = time.perf_counter()
+            try:
+                result = await attempt(model)
+            except PromptTooLarge as e:
+                # Not the model's fault; move on to one with a larger window.
+                last_error = _larger_window(last_error, e)
+                continue
+            except UpstreamError as e:
+                self.registry.record_call(model, time.perf_counter() - start, False)
+                last_error = e
+                continue
+            self.registry.record_call(model, time.perf_counter() - start, True)
+            tracer.annotate(model=model, fallbacks=i)
+            return result
+        raise last_error or UpstreamError(f"No model available for route '{route}'")
+
+
+def _larger_window(previous, error):
+    # When no window fits, the error names the largest one that was tried.
+    if isinstance(previous, PromptTooLarge) and previous.context_window >= error.context_window:
+        return previous
+    return error
+
+
+def load_registry():
+    path = os.environ.get("MODEL_REGISTRY")
+    if not path:
+        return ModelRegistry()
+    with open(path, "r", encoding="utf-8") as f:
+        specs = [ModelSpec(m["name"], tuple(m["capabilities"]), int(m["tier"]), float(m.get("cost_per_mtok", 0)),
+                           float(m.get("latency_hint", 1.0)),
+                           int(m.get("context_window", DEFAULT_CONTEXT_WINDOW)),
+                           bool(m.get("batch_prompts", False))) for m in json.load(f)]
+    return ModelRegistry(specs)
+
+
+def build_selector(policy):
+    return ModelSelector(load_registry(), policy,
+                         cost_weight=float(os.environ.get("MODEL_COST_WEIGHT", 0)),
+                         error_threshold=float(os.environ.get("MODEL_ERROR_THRESHOLD", 0.5)),
+                         recovery_time=float(os.environ.get("MODEL_RECOVERY_TIME", 60)))
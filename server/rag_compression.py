@@ -0,0 +1,91 @@
+import re
+import numpy as np
+from langchain_core.documents import Document
+
+COMPRESSION_MODES = ("none", "embedding", "llm")
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_EXTRACT_RE = re.compile(r"^\[(\d+)\]\s*(.*?)(?=^\[\d+\]|\Z)", re.MULTILINE | re.DOTALL)
+
+BATCH_EXTRACT_TEMPLATE = """Given the question and the numbered context passages below, extract the parts of each passage that are relevant to answering the question. Copy relevant text verbatim; do not paraphrase.
+Answer with one entry per passage in the form "[n] extracted text". If nothing in a passage is relevant, write "[n] NO_OUTPUT".
+Question:
+{question}
+Passages:
+{passages}
+Extracted:"""
+
+
+def _split_sentences(text):
+    return [s.strip() for s in _SENTENCE_RE.split(text) if s and s.strip()]
+
+
+class SentenceEmbeddingCompressor:
+    def __init__(self, embeddings, similarity_threshold=0.45, min_sentences=1):
+        self.embeddings = embeddings
+        self.similarity_threshold = similarity_threshold
+        self.min_sentences = min_sentences
+
+    def compress_documents(self, documents, query):
+        sentences = [_split_sentences(doc.page_content) for doc in documents]
+        flat = [s for doc_sentences in sentences for s in doc_sentences]
+        if not flat:
+            return list(documents)
+        # One embedding request for every sentence of every retrieved chunk.
+        matrix = np.asarray(self.embeddings.embed_documents(flat), dtype=np.float32)
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+        similarity = matrix @ query_vector / np.where(norms == 0, 1.0, norms)
+
+        compressed = []
+        fallback = []
+        offset = 0
+        for doc, doc_sentences in zip(documents, sentences):
+            scores = similarity[offset:offset + len(doc_sentences)]
+            offset += len(doc_sentences)
+            if not doc_sentences:
+                continue
+            keep = np.flatnonzero(scores >= self.similarity_threshold).tolist()
+            best = sorted(np.argsort(-scores)[:self.min_sentences].tolist())
+            if keep:
+                compressed.append(self._rebuild(doc, doc_sentences, keep))
+            fallback.append(self._rebuild(doc, doc_sentences, best))
+        # Chunks with nothing above the threshold are dropped, unless that
+        # would leave no context at all.
+        return compressed or fallback
+
+    @staticmethod
+    def _rebuild(doc, doc_sentences, indices):
+        kept = " ".join(doc_sentences[i] for i in indices)
+        return Document(page_content=kept, metadata=doc.metadata)
+
+
+class BatchedLLMExtractor:
+    def __init__(self, llm):
+        self.llm = llm
+
+    def _prompt(self, documents, query):
+        passages = "\n\n".join(f"[{i + 1}] {doc.page_content}" for i, doc in enumerate(documents))
+        return BATCH_EXTRACT_TEMPLATE.format(question=query, passages=passages)
+
+    def _parse(self, documents, response):
+        extracted = {int(n): text.strip() for n, text in _EXTRACT_RE.findall(response)}
+        if not extracted:
+            # An answer we cannot parse should not empty the context.
+            return list(documents)
+        compressed = []
+        for i, doc in enumerate(documents):
+            text = extracted.get(i + 1, "")
+            if text and text != "NO_OUTPUT":
+                compressed.append(Document(page_content=text, metadata=doc.metadata))
+        return compressed
+
+    def compress_documents(self, documents, query):
+        if not documents:
+            return []
+        return self._parse(documents, self.llm(self._prompt(documents, query)))
+
+    async def acompress_documents(self, documents, query):
+        if not documents:
+            return []
+        return self._parse(documents, await self.llm.acall(self._prompt(documents, query)))
@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+from chunking import LANGUAGE_BY_EXTENSION
+
+LOADER_KINDS = ("text", "csv", "pdf", "code")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(relpath, sha256, index):
+    # The path is part of the id: identical files (empty __init__.py files,
+    # vendored copies) must not share chunks, or deleting one would take the
+    # other's with it.
+    return hashlib.sha256(f"{relpath}:{sha256}:{index}".encode("utf-8")).hexdigest()
+
+
+def scan_knowledge_base(docs_dir, kinds=LOADER_KINDS):
+    found = {}
+    for kind in kinds:
+        root = os.path.join(docs_dir, kind)
+        if not os.path.isdir(root):
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for filename in filenames:
+                if filename.startswith("."):
+                    continue
+                # Only source files are indexed from code/, so build output
+                # and binaries sitting next to them are skipped.
+                if kind == "code" and os.path.splitext(filename)[1].lower() not in LANGUAGE_BY_EXTENSION:
+                    continue
+                path = os.path.join(dirpath, filename)
+                found[os.path.relpath(path, docs_dir)] = kind
+    return found
+
+
+class IndexManifest:
+    def __init__(self, path):
+        self.path = path
+        self.files = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        if self.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files = json.load(f).get("files", {})
+        return self
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "files": self.files}, f)
+        os.replace(tmp_path, self.path)
+
+    def diff(self, docs_dir, found):
+        changed, unchanged = [], []
+        for relpath, kind in sorted(found.items()):
+            stat = os.stat(os.path.join(docs_dir, relpath))
+            entry = self.files.get(relpath)
+            # mtime and size catch almost every edit without reading the file;
+            # the hash is only computed when they move, and a touched but
+            # identical file is re-recorded rather than re-embedded.
+            if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+                unchanged.append(relpath)
+                continue
+            sha256 = file_sha256(os.path.join(docs_dir, relpath))
+            if entry and entry["sha256"] == sha256:
+                entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+                unchanged.append(relpath)
+                continue
+            changed.append((relpath, kind, stat, sha256))
+        deleted = [relpath for relpath in self.files if relpath not in found]
+        return changed, unchanged, deleted
+
+    def record(self, relpath, kind, stat, sha256, chunk_ids):
+        self.files[relpath] = {"kind": kind, "mtime": stat.st_mtime, "size": stat.st_size,
+                               "sha256": sha256, "chunk_ids": chunk_ids}
+
+    def chunk_ids(self, relpath):
+        return self.files.get(relpath, {}).get("chunk_ids", [])
+
+    def forget(self, relpath):
+        return self.files.pop(relpath, {}).get("chunk_ids", [])
+
+    def chunk_count(self):
+        return sum(len(entry.get("chunk_ids", [])) for entry in self.files.values())
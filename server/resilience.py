@@ -0,0 +1,338 @@
+import os
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+import requests
+from tracing import tracer
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class UpstreamError(Exception):
+    http_status = 502
+
+    def __init__(self, message, model=None, status_code=None):
+        super().__init__(message)
+        self.model = model
+        self.status_code = status_code
+
+
+class UpstreamTimeout(UpstreamError):
+    http_status = 504
+
+
+class CircuitOpenError(UpstreamError):
+    http_status = 503
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            # Half-open lets a single probe through; everyone else fails fast
+            # until it reports back.
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        # A half-open probe that ends without an answer (cancelled, or an
+        # error _outcome does not classify) counts as failed; otherwise the
+        # breaker would wait on it forever.
+        with self._lock:
+            probing = self.state == "half_open" and self._probing
+        if probing:
+            self.record_failure()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+
+class LatencyWindow:
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def p95(self):
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+
+class HedgeBudget:
+    # Token bucket for hedges: every hedgeable request earns `ratio` of a
+    # token, at most `burst` are saved up, and a hedge spends one. A p95
+    # learned while the upstream was idle is passed by most requests once it
+    # is loaded; the budget keeps hedges to a small share of traffic then
+    # instead of doubling it.
+    def __init__(self, ratio=0.05, burst=10):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def withdraw(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class ResiliencePolicy:
+    def __init__(self, timeout=60.0, deadline=180.0, max_retries=2, backoff_base=0.25, backoff_max=4.0,
+                 hedge=True, hedge_min_delay=0.05, hedge_workers=64, hedge_budget=0.05, hedge_burst=10,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._latency = {}
+        self._lock = threading.Lock()
+        self._hedge_budget = HedgeBudget(hedge_budget, hedge_burst)
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="llm-hedge") if hedge else None
+
+    def breaker(self, model):
+        with self._lock:
+            if model not in self._breakers:
+                self._breakers[model] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._latency[model] = LatencyWindow()
+            return self._breakers[model]
+
+    def states(self):
+        with self._lock:
+            return {model: breaker.state for model, breaker in self._breakers.items()}
+
+    def _hedge_delay(self, model):
+        # Hedge only a healthy model, and only once there is enough history to
+        # know what a slow request looks like.
+        if not self.hedge or self.breaker(model).state != "closed":
+            return None
+        p95 = self._latency[model].p95()
+        return None if p95 is None else max(p95, self.hedge_min_delay)
+
+    def _backoff(self, attempt, response):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.replace(".", "", 1).isdigit():
+            delay = max(delay, min(float(retry_after), self.backoff_max))
+        return delay
+
+    @staticmethod
+    def _status_error(model, response):
+        return UpstreamError(f"Error from Together AI API: {response.status_code} - {response.text}",
+                             model=model, status_code=response.status_code)
+
+    def _outcome(self, model, breaker, response, exc):
+        # Returns (response, error, retryable); exactly one of response and
+        # error is set.
+        if exc is not None:
+            if isinstance(exc, (requests.Timeout, httpx.TimeoutException)):
+                return None, UpstreamTimeout(f"Upstream request to {model} timed out", model=model), True
+            return None, UpstreamError(f"Upstream request to {model} failed: {exc}", model=model), True
+        if response.status_code == 200:
+            breaker.record_success()
+            return response, None, False
+        error = self._status_error(model, response)
+        if response.status_code not in RETRYABLE_STATUS:
+            # The upstream answered, so the breaker stays closed; the request
+            # itself is bad and retrying will not help.
+            breaker.record_success()
+            return None, error, False
+        return None, error, True
+
+    def _open_error(self, model):
+        return CircuitOpenError(f"Upstream {model} is unavailable; failing fast while it recovers", model=model)
+
+    def call(self, model, send, hedge=True):
+        # send(timeout) performs one HTTP attempt and returns the response.
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise self._open_error(model)
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            response, exc = None, None
+            try:
+                # Streams are neither hedged nor sampled: their latency is
+                # time to first byte, not time to a full answer.
+                response = self._hedged(model, send) if hedge else send(self.timeout)
+            except (requests.RequestException, httpx.HTTPError) as e:
+                exc = e
+            except BaseException:
+                breaker.release_probe()
+                raise
+            result, error, retryable = self._outcome(model, breaker, response, exc)
+            tracer.annotate(attempts=attempt + 1)
+            if error is None:
+                return result
+            if not retryable:
+                raise error
+            breaker.record_failure()
+            delay = self._backoff(attempt, response)
+            if attempt == self.max_retries or time.monotonic() + delay > deadline:
+                raise error
+            time.sleep(delay)
+            if not breaker.allow():
+                raise self._open_error(model)
+
+    def _timed(self, model, send):
+        start = time.perf_counter()
+        response = send(self.timeout)
+        if response.status_code == 200:
+            self._latency[model].add(time.perf_counter() - start)
+        return response
+
+    def _hedged(self, model, send):
+        # A blocking attempt cannot be abandoned once started, so the first
+        # attempt only leaves the caller's thread when a hedge token could be
+        # reserved for it; everything else runs inline. The token goes back
+        # if the first attempt beats the delay, so at most `burst` requests
+        # hold pool workers at once.
+        delay = self._hedge_delay(model)
+        if delay is None:
+            return self._timed(model, send)
+        self._hedge_budget.deposit()
+        if not self._hedge_budget.withdraw():
+            return self._timed(model, send)
+        first = self._hedge_pool.submit(self._timed, model, send)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            self._hedge_budget.refund()
+            return first.result()
+        tracer.annotate(hedged=True)
+        pending = {first, self._hedge_pool.submit(self._timed, model, send)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None and future.result().status_code == 200:
+                    for loser in pending:
+                        loser.add_done_callback(_close_response)
+                    return future.result()
+        return first.result()
+
+    async def acall(self, model, send, hedge=True):
+        # send(timeout) is a coroutine function performing one attempt.
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise self._open_error(model)
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            response, exc = None, None
+            try:
+                response = await (self._ahedged(model, send) if hedge else send(self.timeout))
+            except (requests.RequestException, httpx.HTTPError) as e:
+                exc = e
+            except BaseException:
+                breaker.release_probe()
+                raise
+            result, error, retryable = self._outcome(model, breaker, response, exc)
+            tracer.annotate(attempts=attempt + 1)
+            if error is None:
+                return result
+            if not retryable:
+                raise error
+            breaker.record_failure()
+            delay = self._backoff(attempt, response)
+            if attempt == self.max_retries or time.monotonic() + delay > deadline:
+                raise error
+            await asyncio.sleep(delay)
+            if not breaker.allow():
+                raise self._open_error(model)
+
+    async def _atimed(self, model, send):
+        start = time.perf_counter()
+        response = await send(self.timeout)
+        if response.status_code == 200:
+            self._latency[model].add(time.perf_counter() - start)
+        return response
+
+    async def _ahedged(self, model, send):
+        delay = self._hedge_delay(model)
+        if delay is None:
+            return await self._atimed(model, send)
+        self._hedge_budget.deposit()
+        first = asyncio.ensure_future(self._atimed(model, send))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done or not self._hedge_budget.withdraw():
+            return await first
+        tracer.annotate(hedged=True)
+        pending = {first, asyncio.ensure_future(self._atimed(model, send))}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result().status_code == 200:
+                    for loser in pending:
+                        loser.cancel()
+                    return task.result()
+        return first.result()
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+def build_policy():
+    return ResiliencePolicy(
+        timeout=float(os.environ.get("LLM_TIMEOUT", 60)),
+        deadline=float(os.environ.get("LLM_DEADLINE", 180)),
+        max_retries=int(os.environ.get("LLM_MAX_RETRIES", 2)),
+        backoff_base=float(os.environ.get("LLM_BACKOFF_BASE", 0.25)),
+        backoff_max=float(os.environ.get("LLM_BACKOFF_MAX", 4)),
+        hedge=os.environ.get("LLM_HEDGE", "on").lower() not in ("off", "0", "false"),
+        hedge_min_delay=float(os.environ.get("LLM_HEDGE_MIN_DELAY_MS", 50)) / 1000,
+        hedge_workers=int(os.environ.get("LLM_HEDGE_WORKERS", 64)),
+        hedge_budget=float(os.environ.get("LLM_HEDGE_BUDGET", 0.05)),
+        hedge_burst=int(os.environ.get("LLM_HEDGE_BURST", 10)),
+        failure_threshold=int(os.environ.get("LLM_BREAKER_THRESHOLD", 5)),
+        reset_timeout=float(os.environ.get("LLM_BREAKER_RESET", 30)))
+
+
+completion_policy = build_policy()
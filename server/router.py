@@ -0,0 +1,157 @@
+import re
+import math
+from collections import Counter, namedtuple
+from tracing import tracer
+
+RouteDecision = namedtuple("RouteDecision", ["agent", "confidence", "scores"])
+Subtask = namedtuple("Subtask", ["agent", "instruction", "message"])
+
+AGENT_PROFILES = {
+    "code_completer": {
+        "label": "CodeCompleter",
+        "description": "Handles code generation and completion. Writes, implements, creates and completes functions, classes, scripts and programs.",
+        "patterns": [r"\b(write|implement|create|generate|build|complete|finish|make)\b.*\b(function|class|method|script|program|code|snippet|api|endpoint|component)\b",
+                     r"\bcomplete (this|the|my)\b", r"\bfill in\b", r"\bautocomplete\b"],
+        "examples": ["write a python function to reverse a string",
+                     "complete this code", "implement a binary search in java",
+                     "generate a react component for a login form",
+                     "create a rest api endpoint in flask"],
+    },
+    "bug_detector": {
+        "label": "BugDetector",
+        "description": "Finds and fixes bugs in code. Debugs errors, exceptions, crashes, failing tests and incorrect behaviour.",
+        "patterns": [r"\b(bug|bugs|buggy|debug|fix|fixes|error|errors|exception|traceback|crash|crashes|broken|failing|wrong|issue|issues)\b",
+                     r"\bnot working\b", r"\bwhy (does|is|do)\b.*\b(fail|break|return)"],
+        "examples": ["find bugs in this code", "why does this throw a null pointer exception",
+                     "fix the error in my function", "debug this traceback",
+                     "this loop is broken and returns the wrong result"],
+    },
+    "documentation_agent": {
+        "label": "DocumentationAgent",
+        "description": "Creates documentation. Writes docstrings, comments, README files and API docs that explain code.",
+        "patterns": [r"\b(document|documentation|docs|docstring|docstrings|readme|comment|comments|explain|jsdoc|javadoc)\b"],
+        "examples": ["write a docstring for this function", "generate a readme for my project",
+                     "document this class", "add comments explaining this code",
+                     "create api documentation"],
+    },
+    "rag_agent": {
+        "label": "RAGAgent",
+        "description": "Handles knowledge base queries. Answers questions from loaded documents, manuals, guides and references.",
+        "patterns": [r"\b(knowledge base|knowledge-base|according to|in the docs|from the documents|search|look up|lookup|reference|manual|guide)\b",
+                     r"^(what|who|when|where|which|how does|how do)\b(?!.*\b(code|function|bug)\b)"],
+        "examples": ["what does the knowledge base say about deployment",
+                     "search the documents for the refund policy",
+                     "according to the manual how do i configure logging",
+                     "look up the onboarding guide"],
+    },
+}
+
+AGENT_LABELS = {key: profile["label"] for key, profile in AGENT_PROFILES.items()}
+LABEL_TO_AGENT = {label.lower(): key for key, label in AGENT_LABELS.items()}
+
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_CLAUSE_SPLIT_RE = re.compile(r"\s*(?:;|,?\s+and then\s+|,?\s+then\s+|,?\s+and also\s+|,?\s+also\s+|,?\s+and\s+)\s*", re.IGNORECASE)
+
+
+def _tokenize(text):
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        for suffix in ("ing", "ed", "es", "s"):
+            if len(token) > len(suffix) + 2 and token.endswith(suffix):
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+class IntentRouter:
+    def __init__(self, profiles=AGENT_PROFILES, rule_weight=1.0, similarity_weight=1.0):
+        self.profiles = profiles
+        self.rule_weight = rule_weight
+        self.similarity_weight = similarity_weight
+        self._patterns = {key: [re.compile(p, re.IGNORECASE) for p in profile["patterns"]]
+                          for key, profile in profiles.items()}
+        self._build_tfidf()
+
+    def _build_tfidf(self):
+        documents = {key: _tokenize(" ".join([profile["description"]] + profile["examples"]))
+                     for key, profile in self.profiles.items()}
+        doc_freq = Counter()
+        for tokens in documents.values():
+            doc_freq.update(set(tokens))
+        n = len(documents)
+        self._idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in doc_freq.items()}
+        self._vectors = {key: self._vectorize(tokens) for key, tokens in documents.items()}
+
+    def _vectorize(self, tokens):
+        counts = Counter(t for t in tokens if t in self._idf)
+        vector = {term: count * self._idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    def _rule_scores(self, message):
+        return {key: sum(1 for p in patterns if p.search(message))
+                for key, patterns in self._patterns.items()}
+
+    def _similarity_scores(self, message):
+        query = self._vectorize(_tokenize(message))
+        return {key: sum(w * vector.get(term, 0.0) for term, w in query.items())
+                for key, vector in self._vectors.items()}
+
+    @tracer.wrap("router", "route")
+    def route(self, message):
+        rules = self._rule_scores(message)
+        similarity = self._similarity_scores(message)
+        scores = {key: self.rule_weight * rules[key] + self.similarity_weight * similarity[key]
+                  for key in self.profiles}
+        agent = max(scores, key=scores.get)
+        total = sum(scores.values())
+        # Confidence is the winner's share of the total evidence: a message
+        # matching several agents equally gets a low score and is sent to the
+        # LLM router instead.
+        confidence = scores[agent] / total if total > 0 else 0.0
+        tracer.annotate(agent=agent, confidence=round(confidence, 3))
+        return RouteDecision(agent, confidence, scores)
+
+    @tracer.wrap("router", "plan_subtasks")
+    def plan_subtasks(self, message, min_confidence=0.5):
+        instruction, context = split_instruction(message)
+        clauses = [c.strip(" .,") for c in _CLAUSE_SPLIT_RE.split(instruction) if c.strip(" .,")]
+        planned = []
+        for clause in clauses:
+            decision = self.route(clause)
+            if decision.confidence < min_confidence or not self._rule_scores(clause)[decision.agent]:
+                # Clauses without a keyword of their own ("... that reads and
+                # writes files") belong to whatever came before them.
+                if planned:
+                    planned[-1][1].append(clause)
+                    continue
+                return []
+            if planned and planned[-1][0] == decision.agent:
+                planned[-1][1].append(clause)
+            else:
+                planned.append((decision.agent, [clause]))
+        if len({agent for agent, _ in planned}) < 2:
+            return []
+        subtasks = []
+        for agent, parts in planned:
+            task = " and ".join(parts)
+            body = f"Task: {task}\nOriginal request: {instruction}"
+            if context:
+                body = f"{body}\n{context}"
+            subtasks.append(Subtask(agent, task, body))
+        return subtasks
+
+
+def split_instruction(message):
+    # The instruction is the prose before any code: the first code fence or,
+    # failing that, the first line. Everything after it is shared context
+    # that every subtask needs to see.
+    fence = message.find("```")
+    if fence > 0:
+        return message[:fence].strip(), message[fence:].strip()
+    head, _, tail = message.strip().partition("\n")
+    return head.strip(), tail.strip()
+
+
+router = IntentRouter()
@@ -0,0 +1,122 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from tracing import tracer
+
+
+class SemanticCache:
+    # Answers keyed by the meaning of the message rather than its exact text.
+    # Vectors live unit-normalised in one preallocated float32 matrix, so a
+    # lookup is a single matrix-vector product; slots are reused in
+    # least-recently-used order once the matrix is full.
+    def __init__(self, embeddings, threshold=0.95, max_entries=2048, ttl=3600, max_chars=2000):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+        self._agents = np.full(max_entries, -1, dtype=np.int32)
+        self._entries = [None] * max_entries
+        self._free_slots = list(range(max_entries))
+        self._order = OrderedDict()
+        self._agent_ids = {}
+        self._lock = threading.Lock()
+
+    def cacheable(self, message):
+        # Long messages are mostly pasted code, where a one-character
+        # difference can change the right answer.
+        return bool(message.strip()) and len(message) <= self.max_chars
+
+    def _embed(self, message):
+        vector = np.asarray(self.embeddings.embed_query(message), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _agent_id(self, agent):
+        return self._agent_ids.setdefault(agent, len(self._agent_ids))
+
+    def lookup(self, agent, message):
+        if not self.cacheable(message):
+            return None, None
+        vector = self._embed(message)
+        with self._lock:
+            answer, similarity = self._nearest(agent, vector)
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        tracer.annotate(semantic_cache="hit" if answer is not None else "miss",
+                        semantic_similarity=None if similarity is None else round(similarity, 4))
+        return answer, vector
+
+    def _nearest(self, agent, vector):
+        if self._vectors is None or not self._order or vector.shape[0] != self._vectors.shape[1]:
+            return None, None
+        scores = self._vectors @ vector
+        scores[self._agents != self._agent_id(agent)] = -1.0
+        slot = int(np.argmax(scores))
+        similarity = float(scores[slot])
+        if similarity < self.threshold:
+            return None, similarity
+        answer, expires_at = self._entries[slot]
+        if expires_at < time.time():
+            self._free(slot)
+            return None, similarity
+        self._order.move_to_end(slot)
+        return answer, similarity
+
+    def _free(self, slot):
+        self._order.pop(slot, None)
+        self._agents[slot] = -1
+        self._entries[slot] = None
+        self._free_slots.append(slot)
+
+    def store(self, agent, message, answer, vector=None):
+        if not self.cacheable(message) or not answer:
+            return
+        if vector is None:
+            vector = self._embed(message)
+        with self._lock:
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self._reset()
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot, _ = self._order.popitem(last=False)
+            self._vectors[slot] = vector
+            self._agents[slot] = self._agent_id(agent)
+            self._entries[slot] = (answer, time.time() + self.ttl)
+            self._order[slot] = None
+
+    def _reset(self):
+        self._vectors = None
+        self._agents[:] = -1
+        self._entries = [None] * self.max_entries
+        self._free_slots = list(range(self.max_entries))
+        self._order.clear()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._order), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0}
+
+
+def build_semantic_cache(embeddings):
+    if os.environ.get("SEMANTIC_CACHE", "off").lower() in ("off", "none", "0", "false"):
+        return None
+    return SemanticCache(embeddings,
+                         threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.95)),
+                         max_entries=int(os.environ.get("SEMANTIC_CACHE_SIZE", 2048)),
+                         ttl=float(os.environ.get("SEMANTIC_CACHE_TTL", 3600)),
+                         max_chars=int(os.environ.get("SEMANTIC_CACHE_MAX_CHARS", 2000)))
@@ -1,21 +1,38 @@
 import os
 import sys
-import requests
+import re
+import uuid
+import time
 import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from langchain.agents import initialize_agent, Tool
-from langchain.agents import AgentType
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain.tools import BaseTool
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor
-from langchain_community.document_loaders import TextLoader, DirectoryLoader, CSVLoader, PyPDFLoader
+from langchain_core.tools import BaseTool
+from langchain_core.pydantic_v1 import PrivateAttr
+from http_client import post_completion, apost_completion
+from resilience import UpstreamError, completion_policy
+from models import build_selector
+from chains import PromptChain, ChunkedChain, Registry, merge_sections
+from tokens import count_tokens, fit_completion, input_budget
+from chunking import CodeSplitter, chunk_code, detect_language
+from llm_cache import completion_cache
+from batching import build_dispatcher
+from memory import ConversationMemory
+from session_store import build_session_store
+from semantic_cache import build_semantic_cache
+from tracing import tracer
+from batch_jobs import build_batch_runner
+from router import router, split_instruction, AGENT_LABELS, LABEL_TO_AGENT
+from embedding_models import get_embeddings
+from vector_store import build_vector_store
+from bm25 import BM25Index, HybridRetriever
+from rag_index import IndexManifest, chunk_id, scan_knowledge_base
+from ingest import IngestPipeline
+from rag_compression import COMPRESSION_MODES, SentenceEmbeddingCompressor, BatchedLLMExtractor
 
 # Set the API key from environment variables
 os.environ["TOGETHER_API_KEY"] = str(os.getenv("TOGETHER_API"))
@@ -24,201 +41,482 @@ print(os.environ["TOGETHER_API_KEY"])
 # Initialize Flask app
 app = Flask(__name__)
 # Restrict CORS to your frontend
+CORS_ORIGINS = [
+    "http://localhost:5173/evolvex-code-agentic-ai",
+    "http://localhost:5173",
+    "https://evolvexai.vercel.app"
+]
 CORS(app, resources={
     r"/api/*": {
-        "origins": [
-            "http://localhost:5173/evolvex-code-agentic-ai",
-            "http://localhost:5173",
-            "https://evolvexai.vercel.app"
-        ]
+        "origins": CORS_ORIGINS,
+        "expose_headers": ["X-Session-Id"]
     }
 })
 
 
-class SimpleTracer:
-    def __init__(self, project_name="agent_system_project"):
-        self.project_name = project_name
+model_selector = build_selector(completion_policy)
 
-    def trace(self, run_type="", name="", extra=None):
-        class TracerContext:
-            def __enter__(self):
-                return self
 
-            def __exit__(self, exc_type, exc_val, exc_tb):
-                pass
-        return TracerContext()
+def _prompt_tokens(data):
+    prompts = data.get("prompt", "")
+    return max(count_tokens(p) for p in prompts) if isinstance(prompts, list) and prompts else count_tokens(prompts)
 
 
-tracer = SimpleTracer(project_name="agent_system_project")
+def _fit(data, model, prompt_tokens):
+    max_tokens = fit_completion(prompt_tokens, data.get("max_tokens", 2048),
+                                model_selector.context_window(model), model)
+    return dict(data, model=model, max_tokens=max_tokens)
 
 
-class CustomTogetherLLM:
-    def __init__(self, model="mistralai/Mixtral-8x7B-Instruct-v0.1", temperature=0.7, max_tokens=2048):
-        self.model = model
-        self.temperature = temperature
-        self.max_tokens = max_tokens
-        self.api_key = os.environ.get("TOGETHER_API_KEY")
+def complete(data, api_key=None, stream=False):
+    # data["model"] is a route ("code@2") or a model name; the selector tries
+    # the fastest healthy model that satisfies it and falls back on failure.
+    # Each attempt goes through the resilience policy: timeouts, retries with
+    # backoff, hedging and the per-model circuit breaker. Non-200 answers
+    # raise UpstreamError instead of being returned as text. max_tokens is
+    # clamped to what each model's context window leaves after the prompt;
+    # a prompt that does not fit moves on to a model with a larger window.
+    prompt_tokens = _prompt_tokens(data)
 
-    def _call_api(self, prompt):
-        headers = {"Authorization": f"Bearer {self.api_key}",
-                   "Content-Type": "application/json"}
-        API_ENDPOINT = "https://api.together.xyz/v1/completions"
-        data = {"model": self.model, "prompt": prompt, "max_tokens": self.max_tokens,
-                "temperature": self.temperature, "top_p": 0.95, "stop": ["<|endoftext|>"]}
-        response = requests.post(
-            API_ENDPOINT, headers=headers, data=json.dumps(data))
-        if response.status_code == 200:
-            result = response.json()
-            return result.get("choices", [{}])[0].get("text", "")
-        else:
-            return f"Error from Together AI API: {response.status_code} - {response.text}"
+    def attempt(model):
+        payload = _fit(data, model, prompt_tokens)
+        response = completion_policy.call(
+            model, lambda timeout: post_completion(payload, api_key=api_key, timeout=timeout, stream=stream),
+            hedge=not stream)
+        if not stream:
+            model_selector.registry.record_usage(model, response.json().get("usage"))
+        return response
+    return model_selector.run(data["model"], attempt)
+
+
+async def acomplete(data, api_key=None):
+    prompt_tokens = _prompt_tokens(data)
+
+    async def attempt(model):
+        payload = _fit(data, model, prompt_tokens)
+        response = await completion_policy.acall(
+            model, lambda timeout: apost_completion(payload, api_key=api_key, timeout=timeout))
+        model_selector.registry.record_usage(model, response.json().get("usage"))
+        return response
+    return await model_selector.arun(data["model"], attempt)
 
-    def __call__(self, prompt, *args, **kwargs):
-        return self._call_api(prompt)
 
+def _complete_text(params, prompt):
+    return complete(dict(params, prompt=prompt)).json().get("choices", [{}])[0].get("text", "")
 
-def get_llm(temperature=0.7, model="mistralai/Mixtral-8x7B-Instruct-v0.1"):
-    return CustomTogetherLLM(model=model, temperature=temperature, max_tokens=2048)
 
+def _send_completion_batch(params, prompts):
+    if len(prompts) == 1:
+        return [_complete_text(params, prompts[0])]
+    response = complete(dict(params, prompt=prompts))
+    choices = sorted(response.json().get("choices", []), key=lambda c: c.get("index", 0))
+    if len(choices) == len(prompts):
+        return [choice.get("text", "") for choice in choices]
+    # The upstream did not answer prompt for prompt; rather than fail every
+    # caller in the batch, each prompt is sent again on its own.
+    tracer.annotate(batch_mismatch=len(choices))
+    with ThreadPoolExecutor(max_workers=len(prompts), thread_name_prefix="llm-unbatch") as executor:
+        return list(executor.map(lambda prompt: _complete_text(params, prompt), prompts))
 
-class SimpleEmbeddings:
-    def __init__(self, model="togethercomputer/m2-bert-80M-8k-retrieval"):
+
+# Gathers concurrent prompts with identical sampling parameters into a
+# single multi-prompt request; off unless LLM_BATCH_WINDOW_MS is set, and
+# only used for routes whose every model is marked batch_prompts.
+completion_batcher = build_dispatcher(_send_completion_batch)
+
+
+def _batcher_for(route):
+    if completion_batcher is None or not model_selector.batchable(route):
+        return None
+    return completion_batcher
+
+
+class CustomTogetherLLM:
+    def __init__(self, model="chat@2", temperature=0.7, max_tokens=2048, cache=completion_cache):
         self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
         self.api_key = os.environ.get("TOGETHER_API_KEY")
+        self.cache = cache
+
+    def _params(self):
+        return {"model": self.model, "max_tokens": self.max_tokens,
+                "temperature": self.temperature, "top_p": 0.95, "stop": ["<|endoftext|>"]}
 
-    def embed_documents(self, texts):
-        import numpy as np
-        return [np.random.rand(384) for _ in texts]
+    def _payload(self, prompt):
+        return dict(self._params(), prompt=prompt)
+
+    def _cached(self, prompt):
+        if self.cache is None:
+            return None
+        return self.cache.get(self.model, prompt, self.temperature, self.max_tokens)
+
+    def _store(self, prompt, text):
+        if self.cache is not None:
+            self.cache.set(self.model, prompt, self.temperature, self.max_tokens, text)
+
+    def _count_tokens(self, prompt, text, usage=None):
+        usage = usage or {}
+        tracer.annotate(prompt_tokens=usage.get("prompt_tokens") or count_tokens(prompt),
+                        completion_tokens=usage.get("completion_tokens") or count_tokens(text))
+
+    def _handle_response(self, prompt, response):
+        result = response.json()
+        text = result.get("choices", [{}])[0].get("text", "")
+        self._count_tokens(prompt, text, result.get("usage"))
+        self._store(prompt, text)
+        return text
+
+    def _handle_batched(self, prompt, future, text):
+        tracer.annotate(queue_time=getattr(future, "queue_time", 0.0), batched=True)
+        # Batched responses carry usage for the whole batch only.
+        self._count_tokens(prompt, text)
+        self._store(prompt, text)
+        return text
+
+    def _lookup(self, prompt):
+        cached = self._cached(prompt)
+        if self.cache is not None and self.cache.cacheable(self.temperature):
+            tracer.annotate(**{"cache_hits" if cached is not None else "cache_misses": 1})
+        return cached
 
-    def embed_query(self, text):
-        import numpy as np
-        return np.random.rand(384)
+    def _call_api(self, prompt):
+        batcher = _batcher_for(self.model)
+        if batcher is not None:
+            future = batcher.submit(self._params(), prompt)
+            return self._handle_batched(prompt, future, future.result())
+        response = complete(self._payload(prompt), api_key=self.api_key)
+        return self._handle_response(prompt, response)
 
+    def __call__(self, prompt, *args, **kwargs):
+        with tracer.trace("llm", self.model):
+            cached = self._lookup(prompt)
+            if cached is not None:
+                return cached
+            return self._call_api(prompt)
+
+    async def _acall_api(self, prompt):
+        batcher = _batcher_for(self.model)
+        if batcher is not None:
+            future = batcher.submit(self._params(), prompt)
+            return self._handle_batched(prompt, future, await asyncio.wrap_future(future))
+        response = await acomplete(self._payload(prompt), api_key=self.api_key)
+        return self._handle_response(prompt, response)
+
+    async def acall(self, prompt):
+        with tracer.trace("llm", self.model):
+            cached = self._lookup(prompt)
+            if cached is not None:
+                return cached
+            return await self._acall_api(prompt)
+
+    def stream(self, prompt):
+        with tracer.trace("llm", self.model, {"stream": True}):
+            yield from self._stream(prompt)
+
+    def _stream(self, prompt):
+        cached = self._lookup(prompt)
+        if cached is not None:
+            yield cached
+            return
+        data = dict(self._payload(prompt), stream=True)
+        response = complete(data, api_key=self.api_key, stream=True)
+        chunks = []
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    self._count_tokens(prompt, "".join(chunks))
+                    self._store(prompt, "".join(chunks))
+                    break
+                text = json.loads(payload).get("choices", [{}])[0].get("text", "")
+                if text:
+                    chunks.append(text)
+                    yield text
+
+
+_llms = {}
+_llms_lock = threading.Lock()
+
+
+def get_llm(temperature=0.7, model="chat@2"):
+    # One client per (model, temperature), shared by every agent, tool and
+    # chain that asks for it.
+    key = (model, temperature)
+    llm = _llms.get(key)
+    if llm is None:
+        with _llms_lock:
+            llm = _llms.setdefault(key, CustomTogetherLLM(model=model, temperature=temperature, max_tokens=2048))
+    return llm
+
+
+# Prebuilt chains and tools, created once and shared across requests.
+chains = Registry()
+tool_registry = Registry()
+
+
+embeddings = get_embeddings()
+
+
+RAG_ANSWER_TEMPLATE = """
+        Use the following context to answer the question. If the answer is not in the context, say "I don't have enough information to answer this question."
+        Context:
+        {context}
+        Question:
+        {question}
+        Answer:
+        """
 
-embeddings = SimpleEmbeddings(
-    model="togethercomputer/m2-bert-80M-8k-retrieval")
+chains.register("rag_answer", lambda: PromptChain(
+    get_llm(temperature=0.1), RAG_ANSWER_TEMPLATE, ["context", "question"]))
 
 
 class RAGSystem:
-    def __init__(self, docs_dir="./knowledge_base"):
+    def __init__(self, docs_dir="./knowledge_base", index_dir=None, compression=None, vector_backend=None):
         self.docs_dir = docs_dir
+        self.index_dir = index_dir or os.environ.get("RAG_INDEX_DIR", "./rag_index")
         self.vectorstore = None
+        self.lexical = None
         self.retriever = None
         self.llm = get_llm(temperature=0.1)
+        self.compression = compression or os.environ.get("RAG_COMPRESSION", "embedding")
+        self.compressors = {
+            "embedding": SentenceEmbeddingCompressor(
+                embeddings, similarity_threshold=float(os.environ.get("RAG_SENTENCE_THRESHOLD", 0.45))),
+            "llm": BatchedLLMExtractor(self.llm),
+        }
+        # "numpy" keeps small and medium knowledge bases in an in-process
+        # matrix instead of Chroma; each backend has its own manifest so
+        # switching re-ingests into the new one.
+        self.vector_backend = (vector_backend or os.environ.get("RAG_VECTOR_STORE", "chroma")).lower()
+        if self.vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown vector store '{self.vector_backend}', expected chroma or numpy")
+        manifest_dir = self.index_dir if self.vector_backend == "chroma" else os.path.join(self.index_dir, "numpy")
+        self.manifest = IndexManifest(os.path.join(manifest_dir, "manifest.json"))
+        self.code_splitter = CodeSplitter(max_tokens=int(os.environ.get("RAG_CODE_CHUNK_TOKENS", 400)))
+        self.lexical_dir = os.path.join(manifest_dir, "bm25")
+        self.retriever_mode = os.environ.get("RAG_RETRIEVER", "hybrid").lower()
+
+    def _open_vectorstore(self):
+        if self.vectorstore is None:
+            if self.vector_backend == "numpy":
+                self.vectorstore = build_vector_store(embeddings, os.path.join(self.index_dir, "numpy"))
+            else:
+                from langchain_community.vectorstores import Chroma
+                self.vectorstore = Chroma(
+                    collection_name="knowledge_base", embedding_function=embeddings,
+                    persist_directory=os.path.join(self.index_dir, "chroma"))
+            self._open_lexical()
+        return self.vectorstore
+
+    def _open_lexical(self):
+        # The postings are saved once per load_documents, so after an older
+        # index or an interrupted load they may not match the manifest; they
+        # are then rebuilt from the chunks already in the vector store
+        # instead of re-embedding anything.
+        self.lexical = BM25Index.load(self.lexical_dir)
+        expected = {i for relpath in self.manifest.files for i in self.manifest.chunk_ids(relpath)}
+        if self.lexical is None or set(self.lexical.ids()) != expected:
+            self.lexical = BM25Index()
+            if expected:
+                stored = self.vectorstore.get()
+                self.lexical.add_texts(stored["documents"], stored["ids"])
+                self.lexical.save(self.lexical_dir)
+
+    def _checkpoint(self):
+        # Chroma persists every write, so the manifest can follow each
+        # pipeline batch. The NumPy store is rewritten whole on save, so it
+        # and its manifest are only written once, at the end of the load; an
+        # interrupted load re-ingests the files it had not recorded yet.
+        if self.vector_backend == "chroma":
+            self.manifest.save()
+
+    def _save_indexes(self):
+        if self.vector_backend == "numpy":
+            self.vectorstore.save()
+        self.lexical.save(self.lexical_dir)
+        self.manifest.save()
+
+    def _build_retriever(self):
+        if self.retriever_mode == "hybrid":
+            self.retriever = HybridRetriever(
+                vectorstore=self.vectorstore, lexical=self.lexical, k=5,
+                fetch_k=int(os.environ.get("RAG_HYBRID_FETCH_K", 20)))
+        else:
+            self.retriever = self.vectorstore.as_retriever(
+                search_kwargs={"k": 5})
 
-    def load_documents(self):
-        try:
-            loaders = []
-            if os.path.exists(f"{self.docs_dir}/text"):
-                loaders.append(DirectoryLoader(
-                    f"{self.docs_dir}/text", loader_cls=TextLoader))
-            if os.path.exists(f"{self.docs_dir}/csv"):
-                loaders.append(DirectoryLoader(
-                    f"{self.docs_dir}/csv", loader_cls=CSVLoader))
-            if os.path.exists(f"{self.docs_dir}/pdf"):
-                loaders.append(DirectoryLoader(
-                    f"{self.docs_dir}/pdf", loader_cls=PyPDFLoader))
-            documents = []
-            for loader in loaders:
-                documents.extend(loader.load())
+    def open_index(self):
+        # Serve the persisted index as-is at startup; ingestion only happens
+        # when load_documents is asked for.
+        if not self.manifest.load().exists():
+            return False
+        self._open_vectorstore()
+        self._build_retriever()
+        return True
+
+    def _split_documents(self, relpath, kind, documents, sha256):
+        if kind == "code":
+            splits = self.code_splitter.split_documents(documents, relpath)
+        else:
+            from langchain_text_splitters import RecursiveCharacterTextSplitter
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000, chunk_overlap=200)
             splits = text_splitter.split_documents(documents)
-            self.vectorstore = Chroma.from_documents(
-                documents=splits, embedding=embeddings)
-            base_retriever = self.vectorstore.as_retriever(
-                search_kwargs={"k": 5})
-            compressor = LLMChainExtractor.from_llm(self.llm)
-            self.retriever = ContextualCompressionRetriever(
-                base_compressor=compressor, base_retriever=base_retriever)
-            return f"Successfully loaded {len(splits)} document chunks into the RAG system."
+        for split in splits:
+            split.metadata["source_path"] = relpath
+        return splits, [chunk_id(relpath, sha256, i) for i in range(len(splits))]
+
+    def load_documents(self):
+        try:
+            self.manifest.load()
+            vectorstore = self._open_vectorstore()
+            found = scan_knowledge_base(self.docs_dir)
+            changed, unchanged, deleted = self.manifest.diff(self.docs_dir, found)
+            stale_ids = [i for relpath in deleted for i in self.manifest.forget(relpath)]
+            stale_ids += [i for relpath, *_ in changed for i in self.manifest.chunk_ids(relpath)]
+            if stale_ids:
+                vectorstore.delete(ids=stale_ids)
+                self.lexical.delete(stale_ids)
+            added = 0
+            pipeline = IngestPipeline(vectorstore, self._split_documents, lexical_index=self.lexical)
+            for committed in pipeline.run(self.docs_dir, changed):
+                for relpath, kind, stat, sha256, ids in committed:
+                    self.manifest.record(relpath, kind, stat, sha256, ids)
+                    added += len(ids)
+                self._checkpoint()
+            self._save_indexes()
+            self._build_retriever()
+            failed = f", {len(pipeline.failed)} failed to parse" if pipeline.failed else ""
+            return (f"Successfully loaded {self.manifest.chunk_count()} document chunks into the RAG system "
+                    f"({added} chunks from {len(changed) - len(pipeline.failed)} new or changed files, "
+                    f"{len(deleted)} files removed, {len(unchanged)} unchanged{failed}).")
         except Exception as e:
             return f"Error loading documents: {str(e)}"
 
-    def query(self, question, num_results=3):
+    def _context(self, docs):
+        return "\n\n".join([doc.page_content for doc in docs])
+
+    def _result(self, response, docs):
+        return {"answer": response, "sources": [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]}
+
+    def _compressor(self, compression):
+        compression = compression or self.compression
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(
+                f"Unknown compression mode '{compression}', expected one of {', '.join(COMPRESSION_MODES)}")
+        return self.compressors.get(compression)
+
+    def retrieve(self, question, num_results=3, compression=None):
+        compressor = self._compressor(compression)
+        with tracer.trace("retriever", "retrieve", {"compression": compression or self.compression}) as span:
+            docs = self.retriever.invoke(question)
+            if compressor is not None:
+                docs = compressor.compress_documents(docs, question)
+            span.set(documents=len(docs))
+        return docs[:num_results]
+
+    async def aretrieve(self, question, num_results=3, compression=None):
+        compressor = self._compressor(compression)
+        with tracer.trace("retriever", "retrieve", {"compression": compression or self.compression}) as span:
+            docs = await self.retriever.ainvoke(question)
+            if isinstance(compressor, BatchedLLMExtractor):
+                docs = await compressor.acompress_documents(docs, question)
+            elif compressor is not None:
+                docs = await asyncio.to_thread(compressor.compress_documents, docs, question)
+            span.set(documents=len(docs))
+        return docs[:num_results]
+
+    def query(self, question, num_results=3, compression=None):
         if not self.retriever:
             return "RAG system not initialized. Please load documents first."
-        docs = self.retriever.get_relevant_documents(question)[:num_results]
-        context = "\n\n".join([doc.page_content for doc in docs])
-        template = """
-        Use the following context to answer the question. If the answer is not in the context, say "I don't have enough information to answer this question."
-        Context:
-        {context}
-        Question:
-        {question}
-        Answer:
-        """
-        prompt = PromptTemplate(template=template, input_variables=[
-                                "context", "question"])
-        chain = LLMChain(llm=self.llm, prompt=prompt)
-        response = chain.run(context=context, question=question)
-        return {"answer": response, "sources": [{"content": doc.page_content, "metadata": doc.metadata} for doc in docs]}
+        docs = self.retrieve(question, num_results, compression)
+        response = chains.get("rag_answer").run(context=self._context(docs), question=question)
+        return self._result(response, docs)
+
+    async def aquery(self, question, num_results=3, compression=None):
+        if not self.retriever:
+            return "RAG system not initialized. Please load documents first."
+        docs = await self.aretrieve(question, num_results, compression)
+        response = await chains.get("rag_answer").arun(context=self._context(docs), question=question)
+        return self._result(response, docs)
 
 
 class RAGLoader(BaseTool):
     name: str = "rag_loader"
     description: str = "Loads documents into the RAG system"
 
+    _rag_system: Any = PrivateAttr(default=None)
+
     def __init__(self, rag_system):
         super().__init__()
         self._rag_system = rag_system
 
+    @tracer.wrap("tool")
     def _run(self, docs_dir: str = "") -> str:
         if docs_dir:
             self._rag_system.docs_dir = docs_dir
         return self._rag_system.load_documents()
 
-    def _arun(self, docs_dir: str):
-        raise NotImplementedError("RAGLoader does not support async")
+    async def _arun(self, docs_dir: str = "") -> str:
+        # _run opens the tool span; to_thread carries the caller's trace
+        # context into it.
+        return await asyncio.to_thread(self._run, docs_dir)
 
 
 class RAGQueryTool(BaseTool):
     name: str = "rag_query"
     description: str = "Queries the RAG system for information based on a question"
 
+    _rag_system: Any = PrivateAttr(default=None)
+
     def __init__(self, rag_system):
         super().__init__()
         self._rag_system = rag_system
 
+    @tracer.wrap("tool")
     def _run(self, query: str) -> str:
         result = self._rag_system.query(query)
         return f"Answer: {result['answer']}\nSources: {result['sources']}"
 
-    def _arun(self, query: str):
-        raise NotImplementedError("RAGQueryTool does not support async")
+    @tracer.wrap("tool")
+    async def _arun(self, query: str) -> str:
+        result = await self._rag_system.aquery(query)
+        return f"Answer: {result['answer']}\nSources: {result['sources']}"
+
+
+# StarCoder first; instruction-tuned code models stand in when it is down.
+STAR_CODER_ROUTE = "code_completion,code@2"
 
 
 class StarCodeCompletion(BaseTool):
     name: str = "star_code_completion"
     description: str = "Uses Together AI StarCoder API to complete code with higher accuracy"
 
-    def _run(self, code_context: str) -> str:
-        headers = {
-            "Authorization": f"Bearer {os.environ.get('TOGETHER_API_KEY')}", "Content-Type": "application/json"}
-        STARCODER_API_ENDPOINT = "https://api.together.xyz/v1/completions"
-        data = {"model": "togethercomputer/StarCoder", "prompt": code_context,
+    def _payload(self, code_context):
+        return {"model": STAR_CODER_ROUTE, "prompt": code_context,
                 "max_tokens": 500, "temperature": 0.3, "top_p": 0.95, "stop": ["<|endoftext|>"]}
-        response = requests.post(
-            STARCODER_API_ENDPOINT, headers=headers, data=json.dumps(data))
-        if response.status_code == 200:
-            result = response.json()
-            completion = result.get("choices", [{}])[0].get("text", "")
-            return f"StarCoder suggested completion:\n{completion}"
-        else:
-            return f"Error from Together AI API: {response.status_code} - {response.text}"
 
-    def _arun(self, code_context: str):
-        raise NotImplementedError("StarCodeCompletion does not support async")
+    def _format_response(self, response):
+        completion = response.json().get("choices", [{}])[0].get("text", "")
+        return f"StarCoder suggested completion:\n{completion}"
+
+    @tracer.wrap("tool")
+    def _run(self, code_context: str) -> str:
+        return self._format_response(complete(self._payload(code_context)))
+
+    @tracer.wrap("tool")
+    async def _arun(self, code_context: str) -> str:
+        return self._format_response(await acomplete(self._payload(code_context)))
 
 
 class StarBugDetection(BaseTool):
     name: str = "star_bug_detection"
     description: str = "Uses Together AI StarCoder to detect bugs and provide fixes with higher accuracy"
 
-    def _run(self, code: str) -> str:
-        headers = {
-            "Authorization": f"Bearer {os.environ.get('TOGETHER_API_KEY')}", "Content-Type": "application/json"}
-        STARCODER_API_ENDPOINT = "https://api.together.xyz/v1/completions"
+    def _payload(self, code):
         prompt = f"""
         Analyze the following code for bugs and issues:
         Identify any:
@@ -227,76 +525,59 @@ class StarBugDetection(BaseTool):
         3. Performance issues
         4. Security vulnerabilities
         5. Suggested fixes
+        CODE:
+        {code}
         Analysis:
         """
-        data = {"model": "togethercomputer/StarCoder", "prompt": prompt,
+        return {"model": STAR_CODER_ROUTE, "prompt": prompt,
                 "max_tokens": 700, "temperature": 0.2, "top_p": 0.95, "stop": ["<|endoftext|>"]}
-        response = requests.post(
-            STARCODER_API_ENDPOINT, headers=headers, data=json.dumps(data))
-        if response.status_code == 200:
-            result = response.json()
-            analysis = result.get("choices", [{}])[0].get("text", "")
-            return f"StarCoder bug analysis:\n{analysis}"
-        else:
-            return f"Error from Together AI API: {response.status_code} - {response.text}"
 
-    def _arun(self, code: str):
-        raise NotImplementedError("StarBugDetection does not support async")
+    def _format_response(self, response):
+        analysis = response.json().get("choices", [{}])[0].get("text", "")
+        return f"StarCoder bug analysis:\n{analysis}"
+
+    @tracer.wrap("tool")
+    def _run(self, code: str) -> str:
+        return self._format_response(complete(self._payload(code)))
+
+    @tracer.wrap("tool")
+    async def _arun(self, code: str) -> str:
+        return self._format_response(await acomplete(self._payload(code)))
 
 
 class StarCodeTesting(BaseTool):
     name: str = "star_code_testing"
     description: str = "Uses Together AI StarCoder API to generate test cases for the provided code"
 
-    def _run(self, code: str) -> str:
-        headers = {
-            "Authorization": f"Bearer {os.environ.get('TOGETHER_API_KEY')}", "Content-Type": "application/json"}
-        STARCODER_API_ENDPOINT = "https://api.together.xyz/v1/completions"
-        language = self._detect_language(code)
+    def _payload(self, code):
+        language = detect_language(code)
         prompt = f"""
         Generate comprehensive test cases for the following {language} code:
         Write unit tests that cover:
         1. Normal expected behavior
         2. Edge cases
         3. Error handling
+        CODE:
+        {code}
         Test code:
         """
-        data = {"model": "togethercomputer/StarCoder", "prompt": prompt,
+        return {"model": STAR_CODER_ROUTE, "prompt": prompt,
                 "max_tokens": 800, "temperature": 0.2, "top_p": 0.95, "stop": ["<|endoftext|>"]}
-        response = requests.post(
-            STARCODER_API_ENDPOINT, headers=headers, data=json.dumps(data))
-        if response.status_code == 200:
-            result = response.json()
-            test_code = result.get("choices", [{}])[0].get("text", "")
-            return f"Generated test cases:\n{test_code}"
-        else:
-            return f"Error from Together AI API: {response.status_code} - {response.text}"
-
-    def _detect_language(self, code: str) -> str:
-        if "def " in code or "import " in code or "class " in code and ":" in code:
-            return "Python"
-        elif "function " in code or "const " in code or "let " in code or "var " in code:
-            return "JavaScript"
-        elif "func " in code or "package " in code:
-            return "Go"
-        elif "#include" in code or "int main" in code:
-            return "C++"
-        elif "public class" in code or "import java" in code:
-            return "Java"
-        else:
-            return "Python"
 
-    def _arun(self, code: str):
-        raise NotImplementedError("StarCodeTesting does not support async")
+    def _format_response(self, response):
+        test_code = response.json().get("choices", [{}])[0].get("text", "")
+        return f"Generated test cases:\n{test_code}"
 
+    @tracer.wrap("tool")
+    def _run(self, code: str) -> str:
+        return self._format_response(complete(self._payload(code)))
 
-class DocStringGenerator(BaseTool):
-    name: str = "docstring_generator"
-    description: str = "Generates docstrings for functions and classes"
+    @tracer.wrap("tool")
+    async def _arun(self, code: str) -> str:
+        return self._format_response(await acomplete(self._payload(code)))
 
-    def _run(self, code: str) -> str:
-        llm = get_llm(temperature=0.1)
-        template = """Generate a comprehensive docstring for the following code using the appropriate format for the language. Include:
+
+DOCSTRING_TEMPLATE = """Generate a comprehensive docstring for the following code using the appropriate format for the language. Include:
         - Brief description
         - Parameters with types and descriptions
         - Return values with types and descriptions
@@ -304,21 +585,8 @@ class DocStringGenerator(BaseTool):
         CODE:
         {code}
         DOCSTRING:"""
-        prompt = PromptTemplate(template=template, input_variables=["code"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        return chain.run(code=code)
-
-    def _arun(self, code: str):
-        raise NotImplementedError("DocStringGenerator does not support async")
-
-
-class ReadmeGenerator(BaseTool):
-    name: str = "readme_generator"
-    description: str = "Generates README files for projects"
 
-    def _run(self, project_info: str) -> str:
-        llm = get_llm(temperature=0.2)
-        template = """Generate a comprehensive README.md file for the following project. Include:
+README_TEMPLATE = """Generate a comprehensive README.md file for the following project. Include:
         - Project title and description
         - Installation instructions
         - Usage examples
@@ -328,22 +596,8 @@ class ReadmeGenerator(BaseTool):
         PROJECT INFO:
         {project_info}
         README.md:"""
-        prompt = PromptTemplate(
-            template=template, input_variables=["project_info"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        return chain.run(project_info=project_info)
-
-    def _arun(self, project_info: str):
-        raise NotImplementedError("ReadmeGenerator does not support async")
-
-
-class BugDetector(BaseTool):
-    name: str = "bug_detector"
-    description: str = "Detects potential bugs in code"
 
-    def _run(self, code: str) -> str:
-        llm = get_llm(temperature=0.1)
-        template = """Analyze the following code for potential bugs, errors, or code smells. Include:
+BUG_DETECTOR_TEMPLATE = """Analyze the following code for potential bugs, errors, or code smells. Include:
         - Syntax errors
         - Logical errors
         - Performance issues
@@ -352,78 +606,168 @@ class BugDetector(BaseTool):
         CODE:
         {code}
         BUGS AND ISSUES:"""
-        prompt = PromptTemplate(template=template, input_variables=["code"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        return chain.run(code=code)
 
-    def _arun(self, code: str):
-        raise NotImplementedError("BugDetector does not support async")
+CODE_FIXER_TEMPLATE = """Fix the following code based on the identified bugs and issues. Provide:
+        - Fixed code
+        - Explanation of changes made
+        CODE AND BUGS:
+        {code_and_bugs}
+        FIXED CODE:"""
+
+CODE_COMPLETER_TEMPLATE = """Complete the following code based on the context. Provide a full implementation that follows best practices.
+        CODE CONTEXT:
+        {code_context}
+        COMPLETED CODE:"""
+
+
+# Large pasted files are split on function/class boundaries and the pieces
+# answered in parallel on their own pool; sharing the fan-out pool could
+# deadlock when a subtask waits on chunks queued behind it.
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", 8))
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 0))
+chunk_executor = ThreadPoolExecutor(max_workers=CHUNK_WORKERS, thread_name_prefix="chunk")
+
+
+def _chunk_budget(llm, template):
+    # Input tokens that fit alongside the template and the completion in the
+    # smallest window the LLM's route can land on.
+    return CHUNK_MAX_TOKENS or input_budget(model_selector.route_window(llm.model), llm.max_tokens, template)
+
+
+def _chunked(chain, input_variable):
+    return ChunkedChain(chain, input_variable, _chunk_budget(chain.llm, chain.template), chunk_code, chunk_executor)
+
+
+chains.register("docstring", lambda: _chunked(
+    PromptChain(get_llm(temperature=0.1), DOCSTRING_TEMPLATE, ["code"]), "code"))
+chains.register("readme", lambda: PromptChain(get_llm(temperature=0.2), README_TEMPLATE, ["project_info"]))
+chains.register("bug_detector", lambda: _chunked(
+    PromptChain(get_llm(temperature=0.1), BUG_DETECTOR_TEMPLATE, ["code"]), "code"))
+chains.register("code_fixer", lambda: _chunked(
+    PromptChain(get_llm(temperature=0.2), CODE_FIXER_TEMPLATE, ["code_and_bugs"]), "code_and_bugs"))
+chains.register("code_completer", lambda: PromptChain(
+    get_llm(temperature=0.3, model="code@2"), CODE_COMPLETER_TEMPLATE, ["code_context"]))
+
+
+class DocStringGenerator(BaseTool):
+    name: str = "docstring_generator"
+    description: str = "Generates docstrings for functions and classes"
+
+    @tracer.wrap("tool")
+    def _run(self, code: str) -> str:
+        return chains.get("docstring").run(code=code)
+
+    @tracer.wrap("tool")
+    async def _arun(self, code: str) -> str:
+        return await chains.get("docstring").arun(code=code)
+
+
+class ReadmeGenerator(BaseTool):
+    name: str = "readme_generator"
+    description: str = "Generates README files for projects"
+
+    @tracer.wrap("tool")
+    def _run(self, project_info: str) -> str:
+        return chains.get("readme").run(project_info=project_info)
+
+    @tracer.wrap("tool")
+    async def _arun(self, project_info: str) -> str:
+        return await chains.get("readme").arun(project_info=project_info)
+
+
+class BugDetector(BaseTool):
+    name: str = "bug_detector"
+    description: str = "Detects potential bugs in code"
+
+    @tracer.wrap("tool")
+    def _run(self, code: str) -> str:
+        return chains.get("bug_detector").run(code=code)
+
+    @tracer.wrap("tool")
+    async def _arun(self, code: str) -> str:
+        return await chains.get("bug_detector").arun(code=code)
 
 
 class CodeFixer(BaseTool):
     name: str = "code_fixer"
     description: str = "Fixes bugs in code"
 
+    @tracer.wrap("tool")
     def _run(self, code_and_bugs: str) -> str:
-        llm = get_llm(temperature=0.2)
-        template = """Fix the following code based on the identified bugs and issues. Provide:
-        - Fixed code
-        - Explanation of changes made
-        CODE AND BUGS:
-        {code_and_bugs}
-        FIXED CODE:"""
-        prompt = PromptTemplate(
-            template=template, input_variables=["code_and_bugs"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        return chain.run(code_and_bugs=code_and_bugs)
+        return chains.get("code_fixer").run(code_and_bugs=code_and_bugs)
 
-    def _arun(self, code_and_bugs: str):
-        raise NotImplementedError("CodeFixer does not support async")
+    @tracer.wrap("tool")
+    async def _arun(self, code_and_bugs: str) -> str:
+        return await chains.get("code_fixer").arun(code_and_bugs=code_and_bugs)
 
 
 class CodeCompleter(BaseTool):
     name: str = "code_completer"
     description: str = "Completes code based on context"
 
+    @tracer.wrap("tool")
     def _run(self, code_context: str) -> str:
-        llm = get_llm(temperature=0.3,
-                      model="togethercomputer/CodeLlama-34b-Instruct")
-        template = """Complete the following code based on the context. Provide a full implementation that follows best practices.
-        CODE CONTEXT:
-        {code_context}
-        COMPLETED CODE:"""
-        prompt = PromptTemplate(
-            template=template, input_variables=["code_context"])
-        chain = LLMChain(llm=llm, prompt=prompt)
-        return chain.run(code_context=code_context)
+        return chains.get("code_completer").run(code_context=code_context)
+
+    @tracer.wrap("tool")
+    async def _arun(self, code_context: str) -> str:
+        return await chains.get("code_completer").arun(code_context=code_context)
+
 
-    def _arun(self, code_context: str):
-        raise NotImplementedError("CodeCompleter does not support async")
+for _tool_cls in (StarCodeCompletion, StarBugDetection, StarCodeTesting, DocStringGenerator,
+                  ReadmeGenerator, BugDetector, CodeFixer, CodeCompleter):
+    tool_registry.register(_tool_cls.__fields__["name"].default, _tool_cls)
+
+
+def _initialize_react_agent(tools, llm):
+    from langchain.agents import initialize_agent, AgentType
+    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
 
 
 def initialize_documentation_agent():
     llm = get_llm(temperature=0.2)
-    tools = [DocStringGenerator(), ReadmeGenerator()]
-    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
+    tools = [tool_registry.get("docstring_generator"), tool_registry.get("readme_generator")]
+    return _initialize_react_agent(tools, llm)
 
 
 def initialize_bug_detection_agent():
     llm = get_llm(temperature=0.1)
-    tools = [BugDetector(), CodeFixer(), StarBugDetection(), StarCodeTesting()]
-    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
+    tools = [tool_registry.get(name) for name in
+             ("bug_detector", "code_fixer", "star_bug_detection", "star_code_testing")]
+    return _initialize_react_agent(tools, llm)
 
 
 def initialize_code_completion_agent():
     llm = get_llm(temperature=0.3,
-                  model="togethercomputer/CodeLlama-34b-Instruct")
-    tools = [CodeCompleter(), StarCodeCompletion()]
-    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
+                  model="code@2")
+    tools = [tool_registry.get("code_completer"), tool_registry.get("star_code_completion")]
+    return _initialize_react_agent(tools, llm)
+
+
+def _rag_tool(tool_cls, rag_system):
+    name = tool_cls.__fields__["name"].default
+    tool = tool_registry.get(name) if name in tool_registry else None
+    if tool is None or tool._rag_system is not rag_system:
+        tool = tool_registry.register(name, lambda: tool_cls(rag_system)).get(name)
+    return tool
 
 
 def initialize_rag_agent(rag_system):
     llm = get_llm(temperature=0.2)
-    tools = [RAGQueryTool(rag_system), RAGLoader(rag_system)]
-    return initialize_agent(tools, llm, agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION, verbose=True, handle_parsing_errors=True)
+    tools = [_rag_tool(RAGQueryTool, rag_system), _rag_tool(RAGLoader, rag_system)]
+    return _initialize_react_agent(tools, llm)
+
+
+ROUTER_MIN_CONFIDENCE = float(os.environ.get("ROUTER_MIN_CONFIDENCE", 0.5))
+FANOUT_WORKERS = int(os.environ.get("FANOUT_WORKERS", 8))
+fanout_executor = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS, thread_name_prefix="fanout")
+
+
+session_store = build_session_store(lambda: get_llm(temperature=0.1, model="chat@1"))
+# Near-duplicate first messages ("reverse a string in python" / "python fn
+# reversing a string") share an answer; off unless SEMANTIC_CACHE is set.
+semantic_cache = build_semantic_cache(embeddings)
 
 
 class SimpleAgent:
@@ -438,19 +782,100 @@ class SimpleAgent:
         self.tools.append(tool)
         return self
 
-    def run(self, message, history=None):
-        if history is None:
-            history = []
+    def _history(self, history, session_id):
+        if history is not None:
+            return history
+        return session_store.get(session_id) if session_id else []
+
+    def _record(self, history, message, response, session_id):
         history.append(f"User: {message}")
+        history.append(f"Assistant: {response}")
+        if session_id:
+            history.set_artifact("last_input", message)
+            history.set_artifact("last_output", response)
+            session_store.save(session_id, history)
+
+    def _cached(self, message, history):
+        # Only a conversation's opening message is looked up: later turns
+        # depend on what was said before and cannot share answers.
+        if semantic_cache is None or len(history):
+            return None, None
+        try:
+            return semantic_cache.lookup(self.name, message)
+        except Exception as e:
+            # The cache is an optimisation; an embedding outage must not
+            # fail the request.
+            tracer.annotate(semantic_cache_error=str(e))
+            return None, None
+
+    def _remember(self, message, response, vector):
+        if vector is not None:
+            semantic_cache.store(self.name, message, response, vector)
+
+    @tracer.wrap("agent")
+    def run(self, message, history=None, session_id=None):
+        history = self._history(history, session_id)
+        response, vector = self._cached(message, history)
+        if response is None:
+            response = self.respond(message, history)
+            self._remember(message, response, vector)
+        self._record(history, message, response, session_id)
+        return response
+
+    @tracer.wrap("agent")
+    async def arun(self, message, history=None, session_id=None):
+        # Loading and saving the session hit the session store, and recording
+        # a turn may fold evicted turns through the summarizer LLM; all of
+        # it stays off the event loop.
+        history = await asyncio.to_thread(self._history, history, session_id)
+        response, vector = await asyncio.to_thread(self._cached, message, history)
+        if response is None:
+            response = await self.arespond(message, history)
+            self._remember(message, response, vector)
+        await asyncio.to_thread(self._record, history, message, response, session_id)
+        return response
 
+    def stream(self, message, history=None, session_id=None):
+        history = self._history(history, session_id)
+        chunks = []
+        with tracer.trace("agent", self.name, {"stream": True}):
+            response, vector = self._cached(message, history)
+            if response is not None:
+                yield response
+                self._record(history, message, response, session_id)
+                return
+            for chunk in self.respond_stream(message, history):
+                chunks.append(chunk)
+                yield chunk
+        response = "".join(chunks)
+        self._remember(message, response, vector)
+        self._record(history, message, response, session_id)
+
+    # respond* answer from the conversation so far without recording the
+    # turn, so delegated agents never write the same exchange twice.
+    def respond(self, message, history):
         if self.name == "Manager":
             return self._manager_run(message, history)
         else:
-            return self._specialized_run(message, history)
+            return self._answer(message, history)
 
-    def _manager_run(self, message, history):
-        if " and " in message.lower() or "multiple" in message.lower():
-            prompt = f"""
+    async def arespond(self, message, history):
+        if self.name == "Manager":
+            return await self._amanager_run(message, history)
+        else:
+            return await self._aanswer(message, history)
+
+    def respond_stream(self, message, history):
+        if self.name == "Manager":
+            return self._manager_stream(message, history)
+        else:
+            return self._answer_stream(message, history)
+
+    def _needs_delegation(self, message):
+        return " and " in message.lower() or "multiple" in message.lower()
+
+    def _delegation_prompt(self, message):
+        return f"""
             System: {self.system_message}
             Available agents:
             - CodeCompleter: Handles code generation and completion
@@ -461,38 +886,249 @@ class SimpleAgent:
             Message: {message}
             Respond with only: [DELEGATE:AgentName] (choose the most appropriate agent)
             """
-            response = self.llm(prompt).strip()
-            agent_name = "code_completer"  # Default to correct key
-            agent_name_raw = agent_name  # Default raw name for output
 
-            if response.startswith("[DELEGATE:") and response.endswith("]"):
-                agent_name_raw = response[10:-1].strip()
-                agent_name = agent_name_raw.lower().replace("completer", "completer")
+    def _parse_delegate(self, response):
+        agent_name = "code_completer"  # Default to correct key
+        agent_name_raw = agent_name  # Default raw name for output
+
+        if response.startswith("[DELEGATE:") and response.endswith("]"):
+            agent_name_raw = response[10:-1].strip()
+            agent_name = LABEL_TO_AGENT.get(agent_name_raw.lower(), agent_name_raw.lower())
+        return agent_name, agent_name_raw
+
+    def _local_delegate(self, message):
+        decision = router.route(message)
+        if decision.confidence >= ROUTER_MIN_CONFIDENCE:
+            return decision.agent, AGENT_LABELS[decision.agent]
+        return None
+
+    def _choose_delegate(self, message):
+        return self._local_delegate(message) or self._parse_delegate(
+            self.llm(self._delegation_prompt(message)).strip())
 
-            if agent_name in self.all_agents and agent_name != "manager":
-                delegated_response = self.all_agents[agent_name].run(
+    async def _achoose_delegate(self, message):
+        return self._local_delegate(message) or self._parse_delegate(
+            (await self.llm.acall(self._delegation_prompt(message))).strip())
+
+    def _can_delegate_to(self, agent_name):
+        return agent_name in self.all_agents and agent_name != "manager"
+
+    def _plan(self, message):
+        return [t for t in router.plan_subtasks(message, min_confidence=ROUTER_MIN_CONFIDENCE)
+                if self._can_delegate_to(t.agent)]
+
+    # Subtask failures come back as exception objects so one failed subtask
+    # does not sink the others.
+    def _run_subtask(self, subtask, history):
+        try:
+            return self.all_agents[subtask.agent].respond(subtask.message, history)
+        except Exception as e:
+            return e
+
+    async def _arun_subtask(self, subtask, history, semaphore):
+        async with semaphore:
+            try:
+                return await self.all_agents[subtask.agent].arespond(subtask.message, history)
+            except Exception as e:
+                return e
+
+    @staticmethod
+    def _independent(message):
+        # Subtasks only run side by side when the request carries the code
+        # they all work on. "write a sort function and find bugs in it" has
+        # none: the second clause needs what the first one writes.
+        return bool(split_instruction(message)[1])
+
+    @staticmethod
+    def _chained(subtask, previous):
+        if previous is None or isinstance(previous, Exception):
+            return subtask
+        return subtask._replace(message=f"{subtask.message}\nOutput of the previous step:\n{previous}")
+
+    def _in_order(self, subtasks, history):
+        # Yields (subtask, result) as each finishes, feeding every result
+        # into the next subtask's message.
+        previous = None
+        for t in subtasks:
+            with tracer.trace("subtask", t.agent):
+                result = self._run_subtask(self._chained(t, previous), history)
+            previous = result if not isinstance(result, Exception) else previous
+            yield t, result
+
+    async def _ain_order(self, subtasks, history):
+        results, previous, semaphore = [], None, asyncio.Semaphore(1)
+        for t in subtasks:
+            with tracer.trace("subtask", t.agent):
+                result = await self._arun_subtask(self._chained(t, previous), history, semaphore)
+            previous = result if not isinstance(result, Exception) else previous
+            results.append(result)
+        return self._merge_subtasks(subtasks, results)
+
+    @staticmethod
+    def _subtask_text(result):
+        return f"Error: {str(result)}" if isinstance(result, Exception) else result
+
+    def _merge_subtasks(self, subtasks, results):
+        # Only an upstream outage that took out every subtask fails the request.
+        if all(isinstance(result, UpstreamError) for result in results):
+            raise results[0]
+        sections = [f"[{AGENT_LABELS[t.agent]}] {t.instruction}\n{self._subtask_text(result)}"
+                    for t, result in zip(subtasks, results)]
+        return f"Manager: Split into {len(subtasks)} subtasks\n" + "\n\n".join(sections)
+
+    def _fan_out(self, subtasks, history):
+        futures = [tracer.submit(fanout_executor, "subtask", t.agent, self._run_subtask, t, history)
+                   for t in subtasks]
+        return self._merge_subtasks(subtasks, [f.result() for f in futures])
+
+    async def _afan_out(self, subtasks, history):
+        semaphore = asyncio.Semaphore(FANOUT_WORKERS)
+        results = await asyncio.gather(*[self._arun_subtask(t, history, semaphore) for t in subtasks])
+        return self._merge_subtasks(subtasks, results)
+
+    def _manager_run(self, message, history):
+        if self._needs_delegation(message):
+            subtasks = self._plan(message)
+            if len(subtasks) > 1 and not self._independent(message):
+                return self._merge_subtasks(subtasks, [r for _, r in self._in_order(subtasks, history)])
+            if len(subtasks) > 1:
+                return self._fan_out(subtasks, history)
+            agent_name, agent_name_raw = self._choose_delegate(message)
+            if self._can_delegate_to(agent_name):
+                delegated_response = self.all_agents[agent_name].respond(
                     message, history)
                 return f"Manager: Delegated to {agent_name_raw}\n{delegated_response}"
             else:
-                return f"Manager: Invalid agent '{agent_name_raw}', handling directly\n{self._execute_simple_task(message, history)}"
+                return f"Manager: Invalid agent '{agent_name_raw}', handling directly\n{self._answer(message, history)}"
         else:
-            return self._execute_simple_task(message, history)
-
-    def _execute_simple_task(self, message, history):
-        prompt = f"""
+            return self._answer(message, history)
+
+    async def _amanager_run(self, message, history):
+        if self._needs_delegation(message):
+            subtasks = self._plan(message)
+            if len(subtasks) > 1 and not self._independent(message):
+                return await self._ain_order(subtasks, history)
+            if len(subtasks) > 1:
+                return await self._afan_out(subtasks, history)
+            agent_name, agent_name_raw = await self._achoose_delegate(message)
+            if self._can_delegate_to(agent_name):
+                delegated_response = await self.all_agents[agent_name].arespond(
+                    message, history)
+                return f"Manager: Delegated to {agent_name_raw}\n{delegated_response}"
+            else:
+                return f"Manager: Invalid agent '{agent_name_raw}', handling directly\n{await self._aanswer(message, history)}"
+        else:
+            return await self._aanswer(message, history)
+
+    def _manager_stream(self, message, history):
+        if self._needs_delegation(message):
+            subtasks = self._plan(message)
+            if len(subtasks) > 1:
+                # Sections are emitted in completion order so the fastest
+                # subtask reaches the client first.
+                yield f"Manager: Split into {len(subtasks)} subtasks\n"
+                if self._independent(message):
+                    futures = {tracer.submit(fanout_executor, "subtask", t.agent, self._run_subtask, t, history): t
+                               for t in subtasks}
+                    finished = ((futures[future], future.result()) for future in as_completed(futures))
+                else:
+                    finished = self._in_order(subtasks, history)
+                for i, (t, result) in enumerate(finished):
+                    separator = "\n\n" if i else ""
+                    yield f"{separator}[{AGENT_LABELS[t.agent]}] {t.instruction}\n{self._subtask_text(result)}"
+                return
+            agent_name, agent_name_raw = self._choose_delegate(message)
+            if self._can_delegate_to(agent_name):
+                yield f"Manager: Delegated to {agent_name_raw}\n"
+                yield from self.all_agents[agent_name].respond_stream(message, history)
+                return
+            yield f"Manager: Invalid agent '{agent_name_raw}', handling directly\n"
+        yield from self._answer_stream(message, history)
+
+    def _conversation(self, history):
+        if isinstance(history, ConversationMemory) and len(history):
+            return f"{history.to_prompt()}\n        "
+        return ""
+
+    def _simple_task_prompt(self, message, history):
+        return f"""
         System: I am the Manager agent with basic coding capabilities.
-        Message: {message}
+        {self._conversation(history)}Message: {message}
         Provide a concise response with code if requested, no extra commentary.
         """
-        return self.llm(prompt).strip()
 
-    def _specialized_run(self, message, history):
-        prompt = f"""
+    def _specialized_prompt(self, message, history):
+        return f"""
         System: {self.system_message}
-        Message: {message}
+        {self._conversation(history)}Message: {message}
         Provide a concise response with code if requested, no extra commentary.
         """
-        return self.llm(prompt).strip()
+
+    def _prompt(self, message, history):
+        # The Manager answers what it does not delegate with its own prompt.
+        if self.name == "Manager":
+            return self._simple_task_prompt(message, history)
+        return self._specialized_prompt(message, history)
+
+    def _chunks(self, message, history):
+        # A message whose code would overflow the prompt is answered piece by
+        # piece: the instruction is repeated with each function/class chunk.
+        budget = _chunk_budget(self.llm, self._prompt("", history))
+        if count_tokens(message) <= budget:
+            return None
+        instruction, code = split_instruction(message)
+        fenced = code.startswith("```")
+        if fenced:
+            code = code.split("\n", 1)[-1].rsplit("```", 1)[0]
+        parts = chunk_code(code, max(1, budget - count_tokens(instruction) - 8))
+        if len(parts) <= 1:
+            return None
+        messages = [f"{instruction}\n```\n{p.text}\n```" if fenced else f"{instruction}\n{p.text}" for p in parts]
+        return parts, messages
+
+    def _submit_chunks(self, messages, history):
+        return [tracer.submit(chunk_executor, "chunk", self.name, self._answer, m, history)
+                for m in messages]
+
+    def _answer(self, message, history):
+        chunked = self._chunks(message, history)
+        if chunked:
+            parts, messages = chunked
+            return merge_sections(parts, [f.result() for f in self._submit_chunks(messages, history)])
+        return self.llm(self._prompt(message, history)).strip()
+
+    async def _aanswer(self, message, history):
+        chunked = self._chunks(message, history)
+        if chunked:
+            parts, messages = chunked
+            return merge_sections(parts, await asyncio.gather(*(self._aanswer(m, history) for m in messages)))
+        return (await self.llm.acall(self._prompt(message, history))).strip()
+
+    def _answer_stream(self, message, history):
+        chunked = self._chunks(message, history)
+        if not chunked:
+            return _lstrip_stream(self.llm.stream(self._prompt(message, history)))
+        parts, messages = chunked
+        return self._stream_chunks(parts, self._submit_chunks(messages, history))
+
+    def _stream_chunks(self, parts, futures):
+        # Sections arrive whole and in input order while later chunks are
+        # still being answered.
+        for i, (part, future) in enumerate(zip(parts, futures)):
+            yield ("\n\n" if i else "") + merge_sections([part], [future.result()])
+
+
+def _lstrip_stream(chunks):
+    # Mirrors the .strip() on the blocking path for the leading whitespace;
+    # trailing whitespace cannot be known until the stream ends.
+    started = False
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        yield chunk
 
 
 class SimpleUserAgent:
@@ -526,26 +1162,64 @@ def setup_simple_agents():
     return agents
 
 
-def integrate_tools(agents):
+def integrate_tools(agents, rag_system=None):
     star_completion_tool = {"name": "star_code_completion",
-                            "description": "Get code completion suggestions from Together AI StarCoder API", "func": StarCodeCompletion()._run}
+                            "description": "Get code completion suggestions from Together AI StarCoder API",
+                            "func": tool_registry.get("star_code_completion")._run}
     star_bug_detection_tool = {"name": "star_bug_detection",
-                               "description": "Analyze code for bugs using Together AI StarCoder API", "func": StarBugDetection()._run}
+                               "description": "Analyze code for bugs using Together AI StarCoder API",
+                               "func": tool_registry.get("star_bug_detection")._run}
     star_testing_tool = {"name": "star_code_testing",
-                         "description": "Generate test cases using Together AI StarCoder API", "func": StarCodeTesting()._run}
+                         "description": "Generate test cases using Together AI StarCoder API",
+                         "func": tool_registry.get("star_code_testing")._run}
     agents["code_completer"].register_tool(star_completion_tool)
     agents["bug_detector"].register_tool(star_bug_detection_tool)
     agents["bug_detector"].register_tool(star_testing_tool)
+    if rag_system is not None:
+        rag_query_tool = {"name": "rag_query", "description": "Query the RAG system for information",
+                          "func": _rag_tool(RAGQueryTool, rag_system)._run}
+        rag_loader_tool = {"name": "rag_loader", "description": "Load documents into the RAG system",
+                           "func": _rag_tool(RAGLoader, rag_system)._run}
+        agents["rag_agent"].register_tool(rag_query_tool)
+        agents["rag_agent"].register_tool(rag_loader_tool)
     return agents
 
 
+startup_state = {"agents": False, "rag_index": "loading"}
+
+
+def _warm_rag_index():
+    # Opening Chroma imports chromadb and reads the index from disk; /api/code
+    # never needs it, so it happens off the startup path.
+    try:
+        startup_state["rag_index"] = "warm" if rag_system.open_index() else "absent"
+    except Exception as e:
+        startup_state["rag_index"] = f"error: {str(e)}"
+
+
 # Initialize agents globally
+rag_system = RAGSystem()
 agents = setup_simple_agents()
-agents = integrate_tools(agents)
+agents = integrate_tools(agents, rag_system)
+chains.warm()
+tool_registry.warm()
 manager = agents["manager"]
+startup_state["agents"] = True
+threading.Thread(target=_warm_rag_index, name="rag-warmup", daemon=True).start()
 
 # Flask API Routes
 
+SESSION_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def resolve_session_id(data):
+    session_id = data.get('session_id')
+    if session_id is None:
+        return uuid.uuid4().hex
+    if not isinstance(session_id, str) or not SESSION_ID_RE.match(session_id):
+        raise ValueError('Invalid session_id')
+    return session_id
+
 
 @app.route('/api/code', methods=['POST'])
 def process_code():
@@ -554,19 +1228,140 @@ def process_code():
         user_input = data.get('input', '')
         if not user_input:
             return jsonify({'error': 'No input provided'}), 400
+        try:
+            session_id = resolve_session_id(data)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'status': 'error'}), 400
 
-        response = manager.run(user_input)
-        return jsonify({'output': response, 'status': 'success'}), 200
+        response = manager.run(user_input, session_id=session_id)
+        return jsonify({'output': response, 'session_id': session_id, 'status': 'success'}), 200
 
+    except UpstreamError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), e.http_status
     except Exception as e:
         return jsonify({'error': str(e), 'status': 'error'}), 500
 
 
+@app.route('/api/code/stream', methods=['POST'])
+def process_code_stream():
+    data = request.get_json()
+    user_input = data.get('input', '')
+    if not user_input:
+        return jsonify({'error': 'No input provided'}), 400
+    try:
+        session_id = resolve_session_id(data)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+
+    def generate():
+        try:
+            for chunk in manager.stream(user_input, session_id=session_id):
+                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+            yield f"event: done\ndata: {json.dumps({'session_id': session_id, 'status': 'success'})}\n\n"
+        except UpstreamError as e:
+            error = {'error': str(e), 'status': 'error', 'status_code': e.http_status}
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'error': str(e), 'status': 'error'})}\n\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                             'X-Session-Id': session_id})
+
+
+# /api/batch task names and the tools that serve them; "agent" goes through
+# the manager like /api/code.
+BATCH_TASKS = {
+    "bug_detection": "bug_detector",
+    "docstring": "docstring_generator",
+    "code_fix": "code_fixer",
+    "completion": "code_completer",
+    "tests": "star_code_testing",
+    "agent": None,
+}
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 500))
+
+
+def _run_batch_item(item):
+    tool_name = BATCH_TASKS[item["task"]]
+    if tool_name is None:
+        return manager.run(item["code"])
+    return tool_registry.get(tool_name)._run(item["code"])
+
+
+batch_runner = build_batch_runner(_run_batch_item)
+
+
+def resolve_tenant():
+    # Behind the proxy every client shares remote_addr, and X-Forwarded-For
+    # is whatever the client sends, so the tenant has to name itself.
+    tenant = request.headers.get('X-Tenant-Id')
+    if tenant is None:
+        raise ValueError('X-Tenant-Id header is required')
+    if not SESSION_ID_RE.match(tenant):
+        raise ValueError('Invalid X-Tenant-Id')
+    return tenant
+
+
+def _validate_batch(items):
+    if not isinstance(items, list) or not items:
+        raise ValueError('No items provided')
+    if len(items) > BATCH_MAX_ITEMS:
+        raise ValueError(f'Too many items: {len(items)} (max {BATCH_MAX_ITEMS})')
+    for i, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get('code'), str) or not item['code']:
+            raise ValueError(f'Item {i}: no code provided')
+        if item.get('task') not in BATCH_TASKS:
+            raise ValueError(f"Item {i}: unknown task '{item.get('task')}', expected one of {', '.join(BATCH_TASKS)}")
+
+
+@app.route('/api/batch', methods=['POST'])
+def process_batch():
+    # Streams one NDJSON line per item as it finishes (in completion order,
+    # carrying the item's index and id), then a summary line.
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    try:
+        _validate_batch(items)
+        tenant = resolve_tenant()
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': 'error'}), 400
+
+    def generate():
+        start = time.perf_counter()
+        errors = 0
+        for result in batch_runner.run(tenant, items):
+            errors += result['status'] == 'error'
+            yield json.dumps(result) + "\n"
+        yield json.dumps({'status': 'done', 'items': len(items), 'errors': errors,
+                          'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/', methods=['GET'])
 def health_check():
     return jsonify({'message': 'Server is running', 'status': 'ok'}), 200
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(tracer.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    ready = startup_state["agents"] and startup_state["rag_index"] != "loading"
+    return jsonify({'status': 'ready' if ready else 'starting', 'checks': dict(startup_state),
+                    'upstream': completion_policy.states()}), 200 if ready else 503
+
+
+@app.route('/api/models', methods=['GET'])
+def list_models():
+    return jsonify({'models': model_selector.registry.snapshot(completion_policy.states())}), 200
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
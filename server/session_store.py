@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from memory import ConversationMemory, llm_summarizer
+from sqlite_local import ThreadLocalSQLite
+
+
+class InMemorySessionStore:
+    def __init__(self, max_sessions=1000, idle_ttl=1800, **memory_kwargs):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.memory_kwargs = memory_kwargs
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            self._evict_idle()
+            memory = self._sessions.get(session_id)
+            if memory is None:
+                memory = ConversationMemory(**self.memory_kwargs)
+                self._sessions[session_id] = memory
+            self._sessions.move_to_end(session_id)
+            memory.last_used = time.time()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return memory
+
+    def save(self, session_id, memory):
+        # Process-local sessions are live objects; nothing to write back.
+        pass
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        # Sessions are kept in last-used order, so stop at the first live one.
+        while self._sessions:
+            session_id, memory = next(iter(self._sessions.items()))
+            if memory.last_used >= cutoff:
+                break
+            del self._sessions[session_id]
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path, max_sessions=100000, idle_ttl=1800, sweep_interval=60, **memory_kwargs):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.memory_kwargs = memory_kwargs
+        self._conn = ThreadLocalSQLite(path)
+        self._last_sweep = 0.0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, data TEXT, last_used REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_last_used ON sessions (last_used)")
+        conn.commit()
+
+    def get(self, session_id):
+        self._maybe_sweep()
+        row = self._conn().execute(
+            "SELECT data, last_used FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or row[1] < time.time() - self.idle_ttl:
+            return ConversationMemory(**self.memory_kwargs)
+        return ConversationMemory.from_dict(json.loads(row[0]), **self.memory_kwargs)
+
+    def save(self, session_id, memory):
+        memory.last_used = time.time()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO sessions (session_id, data, last_used) VALUES (?, ?, ?)",
+                     (session_id, json.dumps(memory.to_dict()), memory.last_used))
+        conn.commit()
+
+    def _maybe_sweep(self):
+        now = time.time()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.idle_ttl,))
+        conn.execute("DELETE FROM sessions WHERE session_id NOT IN "
+                     "(SELECT session_id FROM sessions ORDER BY last_used DESC LIMIT ?)", (self.max_sessions,))
+        conn.commit()
+
+    def drop(self, session_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        conn.commit()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def build_session_store(llm_factory=None):
+    summarizer = None
+    if os.environ.get("SESSION_SUMMARY", "extractive").lower() == "llm" and llm_factory is not None:
+        summarizer = llm_summarizer(llm_factory())
+    memory_kwargs = {"token_budget": int(os.environ.get("SESSION_TOKEN_BUDGET", 1024)),
+                     "summary_budget": int(os.environ.get("SESSION_SUMMARY_BUDGET", 256)),
+                     "max_artifact_bytes": int(os.environ.get("SESSION_MAX_ARTIFACT_BYTES", 65536)),
+                     "summarizer": summarizer}
+    idle_ttl = float(os.environ.get("SESSION_IDLE_TTL", 1800))
+    if os.environ.get("SESSION_BACKEND", "memory").lower() == "sqlite":
+        return SQLiteSessionStore(os.environ.get("SESSION_DB_PATH", "./.cache/sessions.sqlite3"),
+                                  max_sessions=int(os.environ.get("SESSION_MAX", 100000)),
+                                  idle_ttl=idle_ttl, **memory_kwargs)
+    return InMemorySessionStore(max_sessions=int(os.environ.get("SESSION_MAX", 1000)),
+                                idle_ttl=idle_ttl, **memory_kwargs)
@@ -0,0 +1,23 @@
+import os
+import sqlite3
+import threading
+
+
+class ThreadLocalSQLite:
+    # sqlite3 connections cannot be shared across threads, so each thread
+    # opens its own on first use; WAL lets every gunicorn worker read while
+    # another one writes.
+    def __init__(self, path, timeout=5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __call__(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,22 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, "benchmarks"))
+
+
+@pytest.fixture(scope="session")
+def server_module():
+    # The server module wires itself up at import time, so it is imported
+    # once, pointed at the local mock completions server.
+    from common import start_mock_server
+    process, base = start_mock_server()
+    os.environ.update(TOGETHER_API_BASE=base, TOGETHER_API_KEY="test", LLM_CACHE="off",
+                      EMBEDDINGS_CACHE_PATH="off", RAG_INDEX_DIR=tempfile.mkdtemp(prefix="evolvex-test-index-"))
+    import server
+    yield server
+    process.terminate()
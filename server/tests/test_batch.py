@@ -0,0 +1,53 @@
+import json
+
+
+def test_batch_prompts_include_the_code(server_module):
+    code = "def add(a, b):\n    return a - b\n"
+    for name in ("star_bug_detection", "star_code_testing"):
+        assert code in server_module.tool_registry.get(name)._payload(code)["prompt"]
+
+
+def test_batch_requires_a_tenant(server_module):
+    client = server_module.app.test_client()
+    items = [{"task": "tests", "code": "def add(a, b):\n    return a + b\n"}]
+    response = client.post("/api/batch", json={"items": items})
+    assert response.status_code == 400
+    assert "X-Tenant-Id" in response.get_json()["error"]
+
+    response = client.post("/api/batch", json={"items": items}, headers={"X-Tenant-Id": "ci-runner"})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert response.status_code == 200
+    assert lines[0]["status"] == "success" and lines[-1]["status"] == "done"
+
+
+class _Response:
+    def __init__(self, texts):
+        self._choices = [{"index": i, "text": text} for i, text in enumerate(texts)]
+
+    def json(self):
+        return {"choices": self._choices}
+
+
+def test_completion_batching_needs_every_candidate_to_accept_prompt_lists(server_module, monkeypatch):
+    selector = server_module.model_selector
+    assert not selector.batchable("chat@2")
+
+    specs = {name: spec._replace(batch_prompts=True) for name, spec in selector.registry.specs.items()}
+    monkeypatch.setattr(selector.registry, "specs", specs)
+    assert selector.batchable("chat@2")
+
+
+def test_batch_with_wrong_choice_count_is_sent_prompt_by_prompt(server_module, monkeypatch):
+    sent = []
+
+    def complete(data, api_key=None, stream=False):
+        sent.append(data["prompt"])
+        if isinstance(data["prompt"], list):
+            return _Response(["only one"])
+        return _Response([f"answer to {data['prompt']}"])
+    monkeypatch.setattr(server_module, "complete", complete)
+
+    texts = server_module._send_completion_batch({"model": "chat@2"}, ["a", "b", "c"])
+
+    assert texts == ["answer to a", "answer to b", "answer to c"]
+    assert sent[0] == ["a", "b", "c"] and sorted(sent[1:]) == ["a", "b", "c"]
@@ -0,0 +1,36 @@
+from chunking import chunk_code
+
+
+def _method(signature, indent, body_lines):
+    body = "".join(f"{indent}    total += lookup(key, {j}) * weight;\n" for j in range(body_lines))
+    return f"{indent}{signature} {{\n{body}{indent}    return total;\n{indent}}}\n"
+
+
+def _assert_methods_whole(source, chunks, signatures):
+    lines = source.split("\n")
+    for signature in signatures:
+        start = next(i for i, line in enumerate(lines, 1) if signature in line)
+        closing = lines[start - 1][:-len(lines[start - 1].lstrip())] + "}"
+        end = next(i for i in range(start, len(lines) + 1) if lines[i - 1] == closing)
+        assert any(c.start_line <= start and end <= c.end_line for c in chunks), signature
+
+
+def test_java_class_over_budget_is_split_between_methods():
+    signatures = [f"public int score{i}(String key)" for i in range(6)]
+    source = ("package demo;\n\npublic class Ledger {\n    private final int weight = 3;\n\n"
+              + "\n".join(f"    @Override\n{_method(s, '    ', 8)}" for s in signatures) + "}\n")
+    chunks = chunk_code(source, 200, "Java")
+
+    assert len(chunks) > 1
+    _assert_methods_whole(source, chunks, signatures)
+    assert "Ledger.score3" in [c.name for c in chunks]
+
+
+def test_javascript_class_over_budget_is_split_between_methods():
+    signatures = [f"async load{i}(key)" for i in range(6)]
+    source = "export class Store {\n" + "\n".join(_method(s, "  ", 8) for s in signatures) + "}\n"
+    chunks = chunk_code(source, 200, "JavaScript")
+
+    assert len(chunks) > 1
+    _assert_methods_whole(source, chunks, signatures)
+    assert "Store.load2" in [c.name for c in chunks]
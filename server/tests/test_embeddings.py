@@ -0,0 +1,37 @@
+import sqlite3
+
+
+class _CountingEmbeddings:
+    model = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+def _rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+def test_documents_are_cached_and_queries_are_not(tmp_path):
+    # Imported here: http_client reads TOGETHER_API_BASE at import, which
+    # the server fixture has to set first.
+    from embedding_models import CachedEmbeddings, EmbeddingCache
+    path = str(tmp_path / "embeddings.sqlite3")
+    base = _CountingEmbeddings()
+    embeddings = CachedEmbeddings(base, EmbeddingCache(path))
+
+    embeddings.embed_documents(["alpha", "beta"])
+    embeddings.embed_documents(["alpha", "beta"])
+    assert base.calls == 1 and _rows(path) == 2
+
+    assert embeddings.embed_query("what is my password?") == [20.0, 1.0]
+    assert _rows(path) == 2
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from models import ModelSelector, ModelRegistry, ModelSpec
+from resilience import ResiliencePolicy
+from tokens import PromptTooLarge, fit_completion
+
+
+def _large_file(functions=400):
+    return "\n\n".join(f"def handler_{i}(request):\n    value = request.args.get('v{i}')\n"
+                       f"    return compute(value, {i}) + offset_{i}\n" for i in range(functions))
+
+
+def test_manager_chunks_a_large_file_on_every_direct_path(server_module):
+    manager = server_module.agents["manager"]
+    message = f"find bugs in this code\n{_large_file()}"
+    assert manager._chunks(message, []) is not None
+
+    for answer in (manager.respond(message, []),
+                   asyncio.run(manager.arespond(message, [])),
+                   "".join(manager.respond_stream(message, []))):
+        assert answer.startswith("[lines 1-")
+        assert "handler_399" in answer
+
+
+def test_prompt_too_large_names_the_largest_window_tried():
+    specs = [ModelSpec("small", ("chat",), 1, 0.1, 1.0, 8192), ModelSpec("large", ("chat",), 1, 0.2, 2.0, 32768)]
+    selector = ModelSelector(ModelRegistry(specs), ResiliencePolicy(hedge=False))
+
+    with pytest.raises(PromptTooLarge) as error:
+        selector.run("chat", lambda model: fit_completion(45000, 512, selector.context_window(model), model))
+    assert error.value.context_window == 32768
+    assert "32768-token window of large" in str(error.value)
+
+
+def _recording_agents(monkeypatch, manager):
+    received = []
+    for name in ("code_completer", "bug_detector", "documentation_agent"):
+        def respond(message, history, name=name):
+            received.append((name, message))
+            return f"output of {name}"
+        monkeypatch.setattr(manager.all_agents[name], "respond", respond)
+    return received
+
+
+def test_dependent_clauses_run_in_order_on_the_previous_output(server_module, monkeypatch):
+    manager = server_module.agents["manager"]
+    received = _recording_agents(monkeypatch, manager)
+
+    answer = manager.respond("write a sorting function and find bugs in it and document it", [])
+
+    assert [name for name, _ in received] == ["code_completer", "bug_detector", "documentation_agent"]
+    assert "output of code_completer" in received[1][1]
+    assert "output of bug_detector" in received[2][1]
+    assert answer.startswith("Manager: Split into 3 subtasks")
+
+
+def test_clauses_sharing_code_each_see_the_code(server_module, monkeypatch):
+    manager = server_module.agents["manager"]
+    received = _recording_agents(monkeypatch, manager)
+
+    manager.respond("find bugs in this and document it\ndef area(r):\n    return 3.14 * r", [])
+
+    assert sorted(name for name, _ in received) == ["bug_detector", "documentation_agent"]
+    assert all("def area(r)" in message and "previous step" not in message for _, message in received)
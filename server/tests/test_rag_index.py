@@ -0,0 +1,32 @@
+import os
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _ingest_duplicates_then_delete_one(server_module, tmp_path, backend):
+    docs_dir = tmp_path / "kb"
+    text = "Shared boilerplate that two files carry verbatim."
+    _write(str(docs_dir / "text" / "a" / "notes.txt"), text)
+    _write(str(docs_dir / "text" / "b" / "notes.txt"), text)
+    rag = server_module.RAGSystem(docs_dir=str(docs_dir), index_dir=str(tmp_path / "index"),
+                                  vector_backend=backend)
+    assert rag.load_documents().startswith("Successfully loaded 2 ")
+    assert len(rag.vectorstore.get()["ids"]) == 2
+
+    os.remove(docs_dir / "text" / "b" / "notes.txt")
+    rag.load_documents()
+    stored = rag.vectorstore.get()
+    assert rag.manifest.chunk_count() == len(stored["ids"]) == 1
+    assert stored["metadatas"][0]["source_path"] == os.path.join("text", "a", "notes.txt")
+
+
+def test_identical_files_get_distinct_chunks_numpy(server_module, tmp_path):
+    _ingest_duplicates_then_delete_one(server_module, tmp_path, "numpy")
+
+
+def test_identical_files_get_distinct_chunks_chroma(server_module, tmp_path):
+    _ingest_duplicates_then_delete_one(server_module, tmp_path, "chroma")
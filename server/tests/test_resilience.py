@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitOpenError, ResiliencePolicy
+
+
+class _Response:
+    status_code = 200
+
+
+def _half_open(policy, model):
+    breaker = policy.breaker(model)
+    for _ in range(policy.failure_threshold):
+        breaker.record_failure()
+    breaker.opened_at -= policy.reset_timeout
+    return breaker
+
+
+def test_cancelled_probe_reopens_the_breaker():
+    policy = ResiliencePolicy(hedge=False, failure_threshold=1, reset_timeout=0.05)
+    breaker = _half_open(policy, "m")
+
+    async def hang(timeout):
+        await asyncio.sleep(10)
+
+    async def probe_then_cancel():
+        task = asyncio.ensure_future(policy.acall("m", hang, hedge=False))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(probe_then_cancel())
+    assert breaker.state == "open"
+
+    async def ok(timeout):
+        return _Response()
+
+    breaker.opened_at -= policy.reset_timeout
+    assert asyncio.run(policy.acall("m", ok, hedge=False)).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_unclassified_error_releases_the_probe():
+    policy = ResiliencePolicy(hedge=False, failure_threshold=1, reset_timeout=60)
+    breaker = _half_open(policy, "m")
+
+    def broken(timeout):
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        policy.call("m", broken, hedge=False)
+    assert breaker.state == "open" and not breaker._probing
+    with pytest.raises(CircuitOpenError):
+        policy.call("m", lambda timeout: _Response(), hedge=False)
@@ -0,0 +1,62 @@
+import os
+import re
+from resilience import UpstreamError
+
+# Word pieces, single punctuation marks and line breaks; code tokenizers
+# spend roughly one token per four characters of an identifier and one per
+# symbol, which this tracks closely enough to budget with a margin.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]|\n")
+
+PROMPT_MARGIN = int(os.environ.get("PROMPT_MARGIN_TOKENS", 64))
+MIN_COMPLETION_TOKENS = int(os.environ.get("MIN_COMPLETION_TOKENS", 256))
+
+
+class PromptTooLarge(UpstreamError):
+    http_status = 413
+
+    def __init__(self, message, model=None, context_window=None):
+        super().__init__(message, model=model)
+        self.context_window = context_window
+
+
+def _load_tokenizer():
+    # TOKENIZER_PATH may point at a Hugging Face tokenizer.json for exact
+    # counts; without it the heuristic above is used.
+    path = os.environ.get("TOKENIZER_PATH")
+    if not path:
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        raise ImportError("TOKENIZER_PATH requires the tokenizers package: pip install tokenizers")
+    return Tokenizer.from_file(path)
+
+
+_tokenizer = _load_tokenizer()
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _tokenizer is not None:
+        return len(_tokenizer.encode(text, add_special_tokens=False).ids)
+    return sum((len(piece) + 3) // 4 if piece[0].isalnum() or piece[0] == "_" else 1
+               for piece in _TOKEN_RE.findall(text))
+
+
+def fit_completion(prompt_tokens, max_tokens, context_window, model=None):
+    # Shrinks the completion to whatever the window leaves after the prompt;
+    # a prompt that leaves too little room is refused so the caller can try
+    # a model with a larger window.
+    available = context_window - prompt_tokens - PROMPT_MARGIN
+    if available < min(MIN_COMPLETION_TOKENS, max_tokens):
+        raise PromptTooLarge(
+            f"Prompt of {prompt_tokens} tokens does not fit the {context_window}-token window of {model}",
+            model=model, context_window=context_window)
+    return min(max_tokens, available)
+
+
+def input_budget(context_window, max_tokens, template):
+    # Tokens left for user input once the template and the completion are
+    # accounted for.
+    return max(1, context_window - max_tokens - count_tokens(template) - PROMPT_MARGIN)
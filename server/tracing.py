@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import uuid
+import inspect
+import threading
+import functools
+import contextvars
+from collections import defaultdict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Span:
+    def __init__(self, tracer, run_type, name, attrs):
+        self.tracer = tracer
+        self.run_type = run_type
+        self.name = name
+        self.attrs = dict(attrs or {})
+        self.parent = None
+        self.trace_id = None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.duration = 0.0
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.trace_id = self.parent.trace_id if self.parent else uuid.uuid4().hex
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.perf_counter() - self._start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # A generator span can be closed from a different context than
+            # the one that opened it; fall back to restoring the parent.
+            _current_span.set(self.parent)
+        self.tracer._finish(self, exc_val)
+        return False
+
+
+class Tracer:
+    def __init__(self, trace_file=None):
+        self.trace_file = trace_file
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._durations = defaultdict(Histogram)
+        self._queue = defaultdict(Histogram)
+        self._errors = defaultdict(int)
+        self._tokens = defaultdict(int)
+        self._cache = defaultdict(int)
+
+    def trace(self, run_type="", name="", extra=None):
+        return Span(self, run_type, name, extra)
+
+    def annotate(self, **attrs):
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attrs)
+
+    def wrap(self, run_type, name=None):
+        # Span name defaults to the owner's `name` (tools, agents) and then
+        # to the function's qualified name.
+        def decorator(fn):
+            def span_name(args):
+                return name or getattr(args[0] if args else None, "name", None) or fn.__qualname__
+
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.trace(run_type, span_name(args)):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.trace(run_type, span_name(args)):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def submit(self, executor, run_type, name, fn, *args, **kwargs):
+        # Runs fn on the executor inside a span parented to the caller's,
+        # recording how long the task waited for a free worker.
+        enqueued = time.perf_counter()
+        context = contextvars.copy_context()
+
+        def run():
+            with self.trace(run_type, name, {"queue_time": time.perf_counter() - enqueued}):
+                return fn(*args, **kwargs)
+        return executor.submit(context.run, run)
+
+    def _finish(self, span, error):
+        key = (span.run_type, span.name)
+        attrs = span.attrs
+        with self._lock:
+            self._durations[key].observe(span.duration)
+            if error is not None or attrs.get("error"):
+                self._errors[key] += 1
+            if "queue_time" in attrs:
+                self._queue[key].observe(attrs["queue_time"])
+            for kind in ("prompt", "completion"):
+                if attrs.get(f"{kind}_tokens"):
+                    self._tokens[key + (kind,)] += attrs[f"{kind}_tokens"]
+            for result in ("hit", "miss"):
+                if attrs.get(f"cache_{result}s"):
+                    self._cache[key + (result,)] += attrs[f"cache_{result}s"]
+        if self.trace_file:
+            self._write(span, error)
+
+    def _write(self, span, error):
+        record = {"trace_id": span.trace_id, "span_id": span.span_id,
+                  "parent_id": span.parent.span_id if span.parent else None,
+                  "run_type": span.run_type, "name": span.name, "start": span.started_at,
+                  "duration_ms": round(span.duration * 1000, 3), "attrs": span.attrs}
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        line = json.dumps(record, default=str) + "\n"
+        with self._file_lock:
+            with open(self.trace_file, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def render_prometheus(self):
+        # Metrics are per process; under gunicorn each worker reports its own.
+        with self._lock:
+            lines = []
+            _histogram(lines, "agent_span_duration_seconds", "Wall time of traced spans.", self._durations)
+            _histogram(lines, "agent_queue_seconds", "Time spent waiting for a worker or batch slot.", self._queue)
+            _counter(lines, "agent_span_errors_total", "Spans that raised or reported an upstream error.", self._errors, ())
+            _counter(lines, "agent_tokens_total", "Prompt and completion tokens.", self._tokens, ("kind",))
+            _counter(lines, "agent_cache_requests_total", "Cache lookups by result.", self._cache, ("result",))
+            return "\n".join(lines) + "\n"
+
+
+def _labels(run_type, name, extra=()):
+    pairs = [("run_type", run_type), ("name", name)] + list(extra)
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped))
+
+
+def _histogram(lines, metric, help_text, histograms):
+    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for (run_type, name), h in sorted(histograms.items()):
+        for bound, count in zip(h.buckets, h.counts):
+            lines.append(f'{metric}_bucket{{{_labels(run_type, name, [("le", bound)])}}} {count}')
+        lines.append(f'{metric}_bucket{{{_labels(run_type, name, [("le", "+Inf")])}}} {h.count}')
+        lines.append(f"{metric}_sum{{{_labels(run_type, name)}}} {h.sum}")
+        lines.append(f"{metric}_count{{{_labels(run_type, name)}}} {h.count}")
+
+
+def _counter(lines, metric, help_text, counters, extra_labels):
+    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+    for key, value in sorted(counters.items()):
+        extra = list(zip(extra_labels, key[2:]))
+        lines.append(f"{metric}{{{_labels(key[0], key[1], extra)}}} {value}")
+
+
+tracer = Tracer(trace_file=os.environ.get("TRACE_FILE") or None)
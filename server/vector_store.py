@@ -0,0 +1,252 @@
+import os
+import json
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores, k):
+    # argpartition finds the k best in linear time; only those k get sorted.
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+
+class IVFIndex:
+    # Inverted-file index: k-means centroids partition the rows and a query
+    # only scores the rows of its nprobe closest partitions.
+    def __init__(self, centroids, labels):
+        self.centroids = centroids
+        self.labels = labels
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+        self.lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+
+    @classmethod
+    def build(cls, vectors, n_lists, iterations=10, sample=50000, seed=0):
+        rng = np.random.default_rng(seed)
+        train = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+        n_lists = min(n_lists, len(train))
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = train[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        labels = np.concatenate([np.argmax(vectors[i:i + 65536] @ centroids.T, axis=1)
+                                 for i in range(0, len(vectors), 65536)]).astype(np.int32)
+        return cls(centroids, labels)
+
+    def candidates(self, query, nprobe):
+        probes = _top_k(self.centroids @ query, min(nprobe, len(self.centroids)))
+        return np.concatenate([self.lists[p] for p in probes])
+
+
+class NumpyVectorStore(VectorStore):
+    # Exact cosine search over one contiguous float32 matrix of unit vectors,
+    # for corpora small enough that a matrix-vector product beats running a
+    # database. Rows are kept dense: deleting moves the last row into the
+    # hole. Past ivf_min_rows an IVF index narrows the search instead:
+    # ivf_lists > 0 fixes the number of partitions, -1 uses sqrt(rows) and 0
+    # keeps every search exact.
+    def __init__(self, embedding, path=None, ivf_lists=0, ivf_nprobe=8, ivf_min_rows=20000):
+        self.embedding = embedding
+        self.path = path
+        self.ivf_lists = ivf_lists
+        self.ivf_nprobe = ivf_nprobe
+        self.ivf_min_rows = ivf_min_rows
+        self._vectors = None
+        self._size = 0
+        self._ids = []
+        self._texts = []
+        self._metadatas = []
+        self._rows = {}
+        self._ivf = None
+        self._lock = threading.RLock()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def __len__(self):
+        return self._size
+
+    def _ensure_capacity(self, dim, extra):
+        # Grows by doubling so a stream of small batches stays amortised
+        # O(1) per row; a memory-mapped matrix is copied on first write.
+        needed = self._size + extra
+        if self._vectors is None:
+            self._vectors = np.zeros((max(needed, 1024), dim), dtype=np.float32)
+        elif needed > self._vectors.shape[0] or not self._vectors.flags.writeable:
+            grown = np.zeros((max(needed, self._vectors.shape[0] * 2), dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+
+    def add_vectors(self, vectors, texts, metadatas=None, ids=None):
+        vectors = _normalize(vectors)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids is not None else [os.urandom(16).hex() for _ in texts]
+        with self._lock:
+            self._ensure_capacity(vectors.shape[1], len(texts))
+            for vector, text, metadata, doc_id in zip(vectors, texts, metadatas, ids):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._rows[doc_id] = self._size
+                    self._size += 1
+                    self._ids.append(doc_id)
+                    self._texts.append(text)
+                    self._metadatas.append(metadata)
+                else:
+                    self._texts[row], self._metadatas[row] = text, metadata
+                self._vectors[row] = vector
+            self._ivf = None
+        return ids
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_vectors(self.embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self._lock:
+            if self._vectors is not None and not self._vectors.flags.writeable:
+                self._ensure_capacity(self._vectors.shape[1], 0)
+            for doc_id in ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                last = self._size - 1
+                if row != last:
+                    self._vectors[row] = self._vectors[last]
+                    self._ids[row] = self._ids[last]
+                    self._texts[row] = self._texts[last]
+                    self._metadatas[row] = self._metadatas[last]
+                    self._rows[self._ids[row]] = row
+                self._ids.pop()
+                self._texts.pop()
+                self._metadatas.pop()
+                self._size = last
+            self._ivf = None
+        return True
+
+    def get(self, ids=None, **kwargs):
+        # Same shape as Chroma.get, for callers that walk every stored chunk.
+        with self._lock:
+            rows = range(self._size) if ids is None else [self._rows[i] for i in ids if i in self._rows]
+            return {"ids": [self._ids[r] for r in rows], "documents": [self._texts[r] for r in rows],
+                    "metadatas": [self._metadatas[r] for r in rows]}
+
+    def _index(self):
+        if self.ivf_lists == 0 or self._size < self.ivf_min_rows:
+            return None
+        if self._ivf is None:
+            n_lists = self.ivf_lists if self.ivf_lists > 0 else int(np.sqrt(self._size))
+            self._ivf = IVFIndex.build(self._vectors[:self._size], n_lists)
+        return self._ivf
+
+    def _matches(self, rows, filter):
+        return np.array([all(self._metadatas[r].get(key) == value for key, value in filter.items()) for r in rows],
+                        dtype=bool)
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        query = _normalize(embedding)
+        with self._lock:
+            if self._size == 0:
+                return []
+            vectors = self._vectors[:self._size]
+            ivf = self._index()
+            rows = ivf.candidates(query, self.ivf_nprobe) if ivf is not None else None
+            if filter:
+                rows = np.arange(self._size) if rows is None else rows
+                rows = rows[self._matches(rows, filter)]
+            if rows is None:
+                scores = vectors @ query
+                best = _top_k(scores, k)
+                hits = zip(best.tolist(), scores[best].tolist())
+            else:
+                scores = vectors[rows] @ query
+                best = _top_k(scores, k)
+                hits = zip(rows[best].tolist(), scores[best].tolist())
+            return [(Document(page_content=self._texts[r], metadata=self._metadatas[r]), score)
+                    for r, score in hits]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    def save(self, path=None):
+        # Written to temporary names and swapped in, so a reader never sees
+        # vectors and documents from different saves.
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            dim = self._vectors.shape[1] if self._vectors is not None else 0
+            vectors = self._vectors[:self._size] if self._vectors is not None else np.zeros((0, dim), np.float32)
+            files = {"vectors.npy": vectors}
+            if self._ivf is not None:
+                files["ivf_centroids.npy"] = self._ivf.centroids
+                files["ivf_labels.npy"] = self._ivf.labels
+            for name, array in files.items():
+                with open(os.path.join(path, f"{name}.tmp"), "wb") as f:
+                    np.save(f, np.ascontiguousarray(array))
+            with open(os.path.join(path, "docs.json.tmp"), "w", encoding="utf-8") as f:
+                json.dump({"ids": self._ids, "texts": self._texts, "metadatas": self._metadatas}, f)
+            for name in list(files) + ["docs.json"]:
+                os.replace(os.path.join(path, f"{name}.tmp"), os.path.join(path, name))
+            if self._ivf is None:
+                for name in ("ivf_centroids.npy", "ivf_labels.npy"):
+                    if os.path.exists(os.path.join(path, name)):
+                        os.remove(os.path.join(path, name))
+
+    @classmethod
+    def load(cls, path, embedding, mmap=True, **kwargs):
+        # Memory-mapped vectors are shared by every worker process through
+        # the page cache instead of being read into each one.
+        store = cls(embedding, path=path, **kwargs)
+        if not os.path.exists(os.path.join(path, "docs.json")):
+            return store
+        with open(os.path.join(path, "docs.json"), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        store._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r" if mmap else None)
+        store._ids, store._texts, store._metadatas = docs["ids"], docs["texts"], docs["metadatas"]
+        store._size = len(store._ids)
+        store._rows = {doc_id: row for row, doc_id in enumerate(store._ids)}
+        if os.path.exists(os.path.join(path, "ivf_labels.npy")):
+            store._ivf = IVFIndex(np.load(os.path.join(path, "ivf_centroids.npy")),
+                                  np.load(os.path.join(path, "ivf_labels.npy")))
+        return store
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+
+def build_vector_store(embedding, path):
+    return NumpyVectorStore.load(
+        path, embedding,
+        ivf_lists=int(os.environ.get("RAG_IVF_LISTS", 0)),
+        ivf_nprobe=int(os.environ.get("RAG_IVF_NPROBE", 8)),
+        ivf_min_rows=int(os.environ.get("RAG_IVF_MIN_ROWS", 20000)))